@@ -0,0 +1,294 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import db
+
+# Synthetic databases are cached in the work directory as bench_<size>.db and
+# reused between runs; results are written as JSON so runs can be compared.
+
+SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "ta", "po", "si", "de", "va", "zo", "chi", "an", "el", "or", "us", "ix", "en"]
+TLDS = [".com", ".org", ".io", ".dev", ".net", ".co.uk"]
+
+def zipf_weights(n, s=1.1):
+    weights = []
+    total = 0.0
+    for rank in range(1, n + 1):
+        total += 1.0 / rank ** s
+        weights.append(total)
+    return weights
+
+def make_words(rng, count):
+    words = set()
+    while len(words) < count:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 4))))
+    return sorted(words)
+
+def generate_db(path, size, seed=1):
+    # Titles and domains follow a Zipf distribution over a fixed vocabulary;
+    # each bookmark gets 1-4 tags drawn the same way from a 500-tag pool.
+    rng = random.Random(seed)
+    words = make_words(rng, 5000)
+    word_weights = zipf_weights(len(words))
+    domains = [rng.choice(words) + rng.choice(TLDS) for _ in range(2000)]
+    domain_weights = zipf_weights(len(domains))
+    tag_names = make_words(rng, 500)
+    tag_weights = zipf_weights(len(tag_names), 1.3)
+    folders = [f"Folder {i}" for i in range(50)] + [f"Folder {i % 50}{db.FOLDER_SEPARATOR}Sub {i}" for i in range(50, 500)]
+
+    db.close_db()
+    db.DB_PATH = path
+    db.init_db()
+    db.migrate_db()
+    now = int(time.time())
+    with db.transaction() as conn:
+        folder_ids = {}
+        for name in folders:
+            db.folder_id_for_path(conn, name, folder_ids)
+        conn.executemany("INSERT INTO tags (name) VALUES (?)", [(name,) for name in tag_names])
+        tag_ids = dict(conn.execute("SELECT name, id FROM tags").fetchall())
+        batch = []
+        links = []
+        for bid in range(1, size + 1):
+            domain = rng.choices(domains, cum_weights=domain_weights)[0]
+            title_words = rng.choices(words, cum_weights=word_weights, k=rng.randint(2, 9))
+            tags = list(dict.fromkeys(rng.choices(tag_names, cum_weights=tag_weights, k=rng.randint(1, 4))))
+            url = f"https://{domain}/{'/'.join(title_words[:3])}/{bid}"
+            folder_id = rng.randint(1, len(folders)) if rng.random() < 0.3 else None
+            color = rng.choice(db.COLORS)
+            created_at = now - rng.randint(0, 5 * 365 * 86400)
+            visits = rng.randint(0, 50) if rng.random() < 0.2 else 0
+            # Derived rather than drawn so the rest of the data matches older databases
+            last_visited = now - bid * 7919 % (now - created_at + 1) if visits else 0
+            batch.append((
+                bid, url, db.url_hash(url), " ".join(title_words).capitalize(), folder_id, color, ",".join(tags),
+                created_at, last_visited, visits, db.initial_frecency(created_at, last_visited, visits),
+            ))
+            links.extend((bid, tag_ids[tag]) for tag in tags)
+            if len(batch) >= 10000:
+                insert_batch(conn, batch, links)
+                batch = []
+                links = []
+        insert_batch(conn, batch, links)
+    db.get_connection().execute("ANALYZE")
+    db.close_db()
+
+def insert_batch(conn, batch, links):
+    conn.executemany(
+        "INSERT INTO bookmarks (id, url, url_hash, title, folder_id, color, tags, created_at, last_visited, visit_count, frecency) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        batch,
+    )
+    conn.executemany("INSERT INTO bookmark_tags (bookmark_id, tag_id) VALUES (?, ?)", links)
+    now = int(time.time())
+    conn.executemany("INSERT INTO page_meta (bookmark_id, next_fetch) VALUES (?, ?)", [(row[0], now + row[0] % db.REFRESH_TTL) for row in batch])
+
+class TitleHandler(BaseHTTPRequestHandler):
+    # Local stand-in for remote sites: every path is a small HTML page with an
+    # ETag, answered with 304 when the client already has it
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        etag = f'"{zlib.crc32(self.path.encode()):08x}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = f"<html><head><title>Stub page {self.path}</title></head><body>{'x' * 2048}</body></html>".encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+class StubServer(ThreadingHTTPServer):
+    # The default backlog of 5 drops connection bursts from the fetch pools,
+    # which then stall for a SYN retransmit
+    request_queue_size = 128
+
+def start_stub_server():
+    server = StubServer(("127.0.0.1", 0), TitleHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def measure(fn, repeat):
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn(i)
+        times.append((time.perf_counter() - start) * 1000)
+    return {
+        "runs": repeat,
+        "min_ms": round(min(times), 3),
+        "median_ms": round(statistics.median(times), 3),
+        "mean_ms": round(statistics.mean(times), 3),
+        "max_ms": round(max(times), 3),
+    }
+
+def bench_db(size, repeat, stub_url, rng):
+    conn = db.get_connection()
+    max_id = conn.execute("SELECT MAX(id) FROM bookmarks").fetchone()[0]
+    tags = [name for name, _ in sorted(db.get_tag_counts(), key=lambda t: -t[1])]
+    words = [row[0].split()[0].lower() for row in conn.execute("SELECT title FROM bookmarks ORDER BY random() LIMIT 50")]
+    ids = rng.sample(range(1, max_id + 1), min(max_id, repeat * 2))
+    results = {}
+    results["get_folders_and_bookmarks"] = measure(lambda i: db.get_folders_and_bookmarks(), max(1, min(repeat, 3)))
+    results["add_bookmark"] = measure(lambda i: db.add_bookmark(f"{stub_url}/add/{size}/{i}/{time.time_ns()}", tags="bench"), repeat)
+    results["add_bookmarks_50"] = measure(lambda i: db.add_bookmarks([f"{stub_url}/bulk/{i}/{n}/{time.time_ns()}" for n in range(50)], tags="bench"), max(1, repeat // 10))
+    results["update_bookmark"] = measure(lambda i: db.update_bookmark(ids[i], f"Updated {i}", "red", "bench,updated"), repeat)
+    results["delete_bookmark"] = measure(lambda i: db.delete_bookmark(ids[repeat + i]), repeat)
+    results["search"] = measure(lambda i: db.search_bookmarks(words[i % len(words)]), repeat)
+    results["search_two_words"] = measure(lambda i: db.search_bookmarks(f"{words[i % len(words)]} {words[(i + 1) % len(words)]}"), repeat)
+    # Drop one letter so the exact search misses and only trigrams can match
+    typos = [word[:len(word) // 2] + word[len(word) // 2 + 1:] + " " + other for word, other in zip(words, reversed(words))]
+    results["search_fuzzy"] = measure(lambda i: db.fuzzy_search(typos[i % len(typos)]), repeat)
+    results["tag_filter_page"] = measure(lambda i: db.get_bookmarks_page("id_desc", limit=101, tag=tags[i % 20]), repeat)
+    results["tag_filter_rare"] = measure(lambda i: db.get_bookmarks_by_tags([tags[-1 - i % 20]]), repeat)
+    results["tag_menu"] = measure(lambda i: db.get_tag_counts(), repeat)
+    results["folder_tree_root"] = measure(lambda i: db.get_folder_children(None), repeat)
+    results["folder_subtree_iter"] = measure(lambda i: sum(1 for _ in db.iter_bookmarks(folder=f"Folder {i % 50}")), repeat)
+    for sort in db.SORT_ORDERS:
+        results[f"page_{sort}"] = measure(lambda i: db.get_bookmarks_page(sort, limit=101), repeat)
+    import refresher
+    refresh_ids = [bid for bid, in conn.execute("SELECT id FROM bookmarks ORDER BY id DESC LIMIT 100")]
+
+    def refresh_stub(i):
+        conn = db.get_connection()
+        etags = dict(conn.execute(f"SELECT bookmark_id, etag FROM page_meta WHERE bookmark_id IN ({', '.join('?' for _ in refresh_ids)})", refresh_ids).fetchall())
+        items = [(bid, f"{stub_url}/refresh/{bid}", etags.get(bid), None) for bid in refresh_ids]
+        refresher.refresh(items, per_host=16, host_delay=0)
+
+    # The first pass gets full pages and ETags; later passes are answered 304
+    results["refresh_first_100"] = measure(refresh_stub, 1)
+    results["refresh_conditional_100"] = measure(refresh_stub, max(1, min(repeat, 5)))
+    db.ARCHIVE = "text"
+    results["capture_100"] = measure(lambda i: refresher.refresh([(bid, f"{stub_url}/capture/{i}/{bid}", None, None) for bid in refresh_ids], per_host=16, host_delay=0), 1)
+    db.ARCHIVE = None
+    results["search_page_text"] = measure(lambda i: db.search_bookmarks("xxx"), repeat)
+    import linkcheck
+    check_ids = [bid for bid, in conn.execute("SELECT id FROM bookmarks ORDER BY id DESC LIMIT 500")]
+    # Everything goes to one stub host, so lift the per-host limits
+    results["check_links_500"] = measure(lambda i: linkcheck.check([(bid, f"{stub_url}/check/{bid}") for bid in check_ids], per_host=linkcheck.MAX_WORKERS, host_delay=0), max(1, min(repeat, 3)))
+    import repository
+    results["repository_load"] = measure(lambda i: repository.load(), max(1, min(repeat, 3)))
+    results["repository_tag_menu"] = measure(lambda i: repository.get_tag_counts(), repeat)
+    # Keystroke by keystroke, as typed into the quick-open palette
+    prefixes = [word[:n] for word in words for n in range(1, len(word) + 1)]
+    results["repository_quick_open"] = measure(lambda i: repository.quick_open(prefixes[i % len(prefixes)]), repeat * 5)
+    results["repository_quick_open_rare"] = measure(lambda i: repository.quick_open(tags[-1 - i % 20]), repeat)
+    results["repository_record_visit"] = measure(lambda i: db.record_visit(ids[i]), repeat)
+    results["repository_update_bookmark"] = measure(lambda i: db.update_bookmark(ids[i], f"Cached {i}", "blue", "bench,cached"), repeat)
+    return results
+
+def bench_ui(repeat):
+    from ui import BookmarkApp
+    results = {}
+
+    async def run():
+        app = BookmarkApp()
+        async with app.run_test() as pilot:
+            await pilot.pause()
+            times = {"show_main_list": [], "sort_change": []}
+            for i in range(repeat):
+                start = time.perf_counter()
+                app._drop_home_view()
+                app.show_main_list()
+                await pilot.pause()
+                times["show_main_list"].append((time.perf_counter() - start) * 1000)
+                app._sort_mode = "title_az" if i % 2 == 0 else "id_asc"
+                start = time.perf_counter()
+                app.show_main_list()
+                await pilot.pause()
+                times["sort_change"].append((time.perf_counter() - start) * 1000)
+            for name, values in times.items():
+                results[name] = {
+                    "runs": repeat,
+                    "min_ms": round(min(values), 3),
+                    "median_ms": round(statistics.median(values), 3),
+                    "mean_ms": round(statistics.mean(values), 3),
+                    "max_ms": round(max(values), 3),
+                }
+
+    asyncio.run(run())
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark LinkDB against synthetic databases")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000], help="bookmark counts to test (e.g. 10000 100000 1000000)")
+    parser.add_argument("--repeat", type=int, default=20, help="runs per operation")
+    parser.add_argument("--workdir", default="bench_data", help="where generated databases are cached")
+    parser.add_argument("--no-ui", action="store_true", help="skip the Textual rendering benchmarks")
+    parser.add_argument("-o", "--output", help="write JSON results here instead of stdout")
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.workdir, exist_ok=True)
+    server = start_stub_server()
+    stub_url = f"http://127.0.0.1:{server.server_address[1]}"
+    report = {
+        "timestamp": int(time.time()),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "sizes": {},
+    }
+    rng = random.Random(42)
+    for size in args.sizes:
+        source = os.path.join(args.workdir, f"bench_{size}.db")
+        if not os.path.exists(source):
+            print(f"Generating {size} bookmarks...", file=sys.stderr)
+            start = time.perf_counter()
+            generate_db(source, size)
+            print(f"  done in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+        # Work on a copy so mutations don't accumulate in the cached database
+        work = os.path.join(args.workdir, f"run_{size}.db")
+        src = sqlite3.connect(source)
+        dst = sqlite3.connect(work)
+        src.backup(dst)
+        src.close()
+        dst.close()
+        db.close_db()
+        db.DB_PATH = work
+        db.migrate_db()
+        print(f"Benchmarking {size} bookmarks...", file=sys.stderr)
+        results = bench_db(size, args.repeat, stub_url, rng)
+        if not args.no_ui:
+            results.update(bench_ui(min(args.repeat, 5)))
+        report["sizes"][str(size)] = results
+        db.close_db()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(work + suffix):
+                os.remove(work + suffix)
+    server.shutdown()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,276 @@
+import argparse
+import json
+import sys
+
+# Headless commands; these only need db.py, so Textual and requests are never
+# imported unless a command actually fetches something.
+
+def print_bookmarks(rows, as_json):
+    for bid, url, title, folder_id, color, tags in rows:
+        if as_json:
+            print(json.dumps({"id": bid, "url": url, "title": title, "folder_id": folder_id, "color": color, "tags": tags or ""}, ensure_ascii=False))
+        else:
+            print(f"{bid}\t{title or url}\t{url}")
+
+def cmd_add(args):
+    from db import add_bookmark, add_bookmarks, find_bookmark, get_bookmarks, split_tags
+    tags = ",".join(split_tags(args.tags)) or "main"
+    if args.title:
+        if len(args.urls) != 1:
+            raise SystemExit("linkdb add: --title needs exactly one URL")
+        existing = find_bookmark(args.urls[0])
+        bid = add_bookmark(args.urls[0], title=args.title, tags=tags)
+        ids = [] if existing else [bid]
+    else:
+        ids = add_bookmarks(args.urls, tags=tags, fetch=not args.no_fetch)
+    print_bookmarks(get_bookmarks(ids), args.json)
+    skipped = len(args.urls) - len(ids)
+    if skipped:
+        print(f"{skipped} already saved (tags merged)", file=sys.stderr)
+    return 0
+
+def cmd_search(args):
+    from db import fuzzy_search, search_bookmarks
+    query = " ".join(args.query)
+    rows = [] if args.fuzzy else search_bookmarks(query, limit=args.limit)
+    if not rows:
+        rows = fuzzy_search(query, limit=args.limit)
+    print_bookmarks(rows, args.json)
+    return 0
+
+def cmd_ls(args):
+    from db import HEALTH_NAMES, get_bookmarks_by_tags, get_bookmarks_page
+    if len(args.tag) > 1:
+        rows = get_bookmarks_by_tags(args.tag, match_all=args.all)
+        print_bookmarks(rows[:args.limit] if args.limit else rows, args.json)
+        return 0
+    tag = args.tag[0] if args.tag else None
+    health = HEALTH_NAMES.index(args.health) if args.health else None
+    remaining = args.limit
+    after_id = None
+    # Walk the sort index page by page instead of loading the whole table
+    while remaining is None or remaining > 0:
+        page_size = 500 if remaining is None else min(500, remaining)
+        rows = get_bookmarks_page(args.sort, after_id=after_id, limit=page_size, tag=tag, health=health)
+        if not rows:
+            break
+        print_bookmarks(rows, args.json)
+        after_id = rows[-1][0]
+        if remaining is not None:
+            remaining -= len(rows)
+    return 0
+
+def cmd_tag(args):
+    from db import get_bookmarks, get_tag_counts, split_tags, update_bookmark
+    if args.id is None:
+        for name, count in get_tag_counts():
+            print(json.dumps({"tag": name, "count": count}) if args.json else f"{name}\t{count}")
+        return 0
+    rows = get_bookmarks([args.id])
+    if not rows:
+        raise SystemExit(f"linkdb tag: no bookmark with id {args.id}")
+    bid, url, title, folder_id, color, tags = rows[0]
+    names = split_tags(tags)
+    for name in split_tags(",".join(args.tags)):
+        if args.remove:
+            if name in names:
+                names.remove(name)
+        elif name not in names:
+            names.append(name)
+    update_bookmark(bid, title, color, ",".join(names) or "main")
+    print_bookmarks(get_bookmarks([bid]), args.json)
+    return 0
+
+def cmd_rm(args):
+    from db import delete_bookmarks, get_bookmarks
+    rows = get_bookmarks(args.ids)
+    delete_bookmarks([row[0] for row in rows])
+    print_bookmarks(rows, args.json)
+    return 0
+
+def cmd_dedupe(args):
+    from db import dedupe_bookmarks
+    merged = dedupe_bookmarks(dry_run=args.dry_run)
+    for kept, removed in merged:
+        if args.json:
+            print(json.dumps({"kept": kept, "removed": removed}))
+        else:
+            print(f"{kept}\t" + " ".join(str(bid) for bid in removed))
+    verb = "Would merge" if args.dry_run else "Merged"
+    print(f"{verb} {sum(len(removed) for kept, removed in merged)} duplicate bookmarks", file=sys.stderr)
+    return 0
+
+def cmd_refresh(args):
+    import refresher
+    from db import get_due_pages
+    total = changed = 0
+    def count(titles):
+        nonlocal changed
+        changed += len(titles)
+        if args.verbose:
+            for bid, title in titles:
+                print(f"{bid}\t{title}")
+    # Keep going until nothing is due or the limit is reached
+    while args.limit is None or total < args.limit:
+        batch = refresher.BATCH_SIZE if args.limit is None else min(refresher.BATCH_SIZE, args.limit - total)
+        items = get_due_pages(batch)
+        if not items:
+            break
+        total += refresher.refresh(items, on_titles=count, max_workers=args.workers, host_delay=args.host_delay)
+    print(f"Fetched {total} pages, {changed} titles changed", file=sys.stderr)
+    return 0
+
+def cmd_check(args):
+    import time
+    import linkcheck
+    from db import HEALTH_NAMES, HEALTH_ERROR, get_bookmarks, get_link_health
+    start = time.perf_counter()
+    done = 0
+    bad = []
+    def progress(recorded):
+        nonlocal done
+        done += len(recorded)
+        bad.extend(bid for bid, health in recorded if health >= HEALTH_ERROR)
+        if sys.stderr.isatty():
+            print(f"\rChecked {done} links", end="", file=sys.stderr, flush=True)
+    counts = linkcheck.check_all(
+        max_age=args.max_age * 86400, limit=args.limit, on_results=progress,
+        max_workers=args.workers, host_delay=args.host_delay,
+    )
+    if sys.stderr.isatty() and done:
+        print(file=sys.stderr)
+    if bad:
+        health = get_link_health(bad)
+        for bid, url, title, folder_id, color, tags in get_bookmarks(bad):
+            state, status, final_url, redirects, latency_ms, error, checked_at = health[bid]
+            if args.json:
+                print(json.dumps({"id": bid, "url": url, "health": HEALTH_NAMES[state], "status": status, "final_url": final_url, "error": error}, ensure_ascii=False))
+            else:
+                print(f"{bid}\t{HEALTH_NAMES[state]}\t{status or error}\t{url}")
+    summary = ", ".join(f"{counts[health]} {name}" for health, name in enumerate(HEALTH_NAMES) if counts[health])
+    print(f"Checked {done} links in {time.perf_counter() - start:.1f}s" + (f": {summary}" if summary else ""), file=sys.stderr)
+    return 0
+
+def cmd_archive(args):
+    import db
+    import refresher
+    if not args.stats:
+        db.ARCHIVE = "html" if args.html else db.ARCHIVE or "text"
+        done = 0
+        after_id = 0
+        while args.limit is None or done < args.limit:
+            batch = refresher.BATCH_SIZE if args.limit is None else min(refresher.BATCH_SIZE, args.limit - done)
+            items = db.get_unarchived(after_id, batch)
+            if not items:
+                break
+            after_id = items[-1][0]
+            done += refresher.refresh(items, max_workers=args.workers, host_delay=args.host_delay)
+        print(f"Fetched {done} pages", file=sys.stderr)
+    captured, pages, size, stored = db.get_archive_stats()
+    stats = {"bookmarks": captured, "pages": pages, "bytes": size, "stored_bytes": stored}
+    if args.json:
+        print(json.dumps(stats))
+    else:
+        print(f"{captured} bookmarks archived as {pages} distinct pages, {size / 1048576:.1f} MiB stored in {stored / 1048576:.1f} MiB")
+    return 0
+
+def cmd_text(args):
+    from db import get_archived_page
+    page = get_archived_page(args.id)
+    if page is None:
+        raise SystemExit(f"linkdb text: no archived page for bookmark {args.id} (see linkdb archive)")
+    text, html, captured_at = page
+    if args.html and html is None:
+        raise SystemExit(f"linkdb text: only the text of bookmark {args.id} was archived")
+    print(html if args.html else text)
+    return 0
+
+def build_parser():
+    from db import HEALTH_NAMES, SORT_ORDERS
+    parser = argparse.ArgumentParser(prog="linkdb", description="LinkDB command line. Run without a command to open the TUI.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add = commands.add_parser("add", help="save one or more links")
+    add.add_argument("urls", nargs="+")
+    add.add_argument("--tags", default="", help="comma or space separated tags (default: main)")
+    add.add_argument("--title", help="use this title instead of fetching it (single URL only)")
+    add.add_argument("--no-fetch", action="store_true", help="save now and let the app fetch titles later")
+    add.set_defaults(func=cmd_add)
+
+    search = commands.add_parser("search", help="full-text search over title, url, tags and archived page text; falls back to fuzzy matching")
+    search.add_argument("query", nargs="+")
+    search.add_argument("--limit", type=int, default=50)
+    search.add_argument("--fuzzy", action="store_true", help="rank by typo-tolerant similarity even when there are exact matches")
+    search.set_defaults(func=cmd_search)
+
+    ls = commands.add_parser("ls", help="list bookmarks")
+    ls.add_argument("--tag", action="append", default=[], help="filter by tag; repeat for several")
+    ls.add_argument("--all", action="store_true", help="with several --tag, require all of them")
+    ls.add_argument("--sort", choices=list(SORT_ORDERS), default="id_desc")
+    ls.add_argument("--health", choices=HEALTH_NAMES, help="only links in this state after the last check")
+    ls.add_argument("--limit", type=int)
+    ls.set_defaults(func=cmd_ls)
+
+    tag = commands.add_parser("tag", help="list tags, or add/remove tags on a bookmark")
+    tag.add_argument("id", type=int, nargs="?")
+    tag.add_argument("tags", nargs="*")
+    tag.add_argument("--remove", action="store_true", help="remove the given tags instead of adding them")
+    tag.set_defaults(func=cmd_tag)
+
+    rm = commands.add_parser("rm", help="delete bookmarks by id")
+    rm.add_argument("ids", type=int, nargs="+")
+    rm.set_defaults(func=cmd_rm)
+
+    dedupe = commands.add_parser("dedupe", help="merge bookmarks that point to the same page")
+    dedupe.add_argument("--dry-run", action="store_true", help="only list what would be merged")
+    dedupe.set_defaults(func=cmd_dedupe)
+
+    refresh = commands.add_parser("refresh", help="fetch pending titles and re-check stale or failed ones")
+    refresh.add_argument("--limit", type=int, help="fetch at most this many pages")
+    refresh.add_argument("--workers", type=int, default=8, help="concurrent requests (default: 8)")
+    refresh.add_argument("--host-delay", type=float, default=1.0, help="seconds between requests to one host (default: 1)")
+    refresh.add_argument("-v", "--verbose", action="store_true", help="print each changed title")
+    refresh.set_defaults(func=cmd_refresh)
+
+    check = commands.add_parser("check", help="check links for dead pages and redirects; prints the failing ones")
+    check.add_argument("--max-age", type=float, default=7, help="skip links checked within this many days (default: 7, 0 rechecks all)")
+    check.add_argument("--limit", type=int, help="check at most this many links")
+    check.add_argument("--workers", type=int, default=32, help="concurrent requests (default: 32)")
+    check.add_argument("--host-delay", type=float, default=0.5, help="seconds between requests to one host (default: 0.5)")
+    check.set_defaults(func=cmd_check)
+
+    archive = commands.add_parser("archive", help="capture the text of pages not archived yet, for offline reading and search")
+    archive.add_argument("--html", action="store_true", help="keep the page markup as well")
+    archive.add_argument("--stats", action="store_true", help="only print archive size")
+    archive.add_argument("--limit", type=int, help="fetch at most this many pages")
+    archive.add_argument("--workers", type=int, default=8, help="concurrent requests (default: 8)")
+    archive.add_argument("--host-delay", type=float, default=1.0, help="seconds between requests to one host (default: 1)")
+    archive.set_defaults(func=cmd_archive)
+
+    text = commands.add_parser("text", help="print the archived text of a bookmark")
+    text.add_argument("id", type=int)
+    text.add_argument("--html", action="store_true", help="print the archived markup instead")
+    text.set_defaults(func=cmd_text)
+
+    for command in (add, search, ls, tag, rm, dedupe, check, archive):
+        command.add_argument("--json", action="store_true", help="print one JSON object per line")
+
+    commands.add_parser("import", help="import a browser export (see linkdb import -h)", add_help=False)
+    commands.add_parser("export", help="export bookmarks (see linkdb export -h)", add_help=False)
+    return parser
+
+def main(argv):
+    if argv[:1] == ["import"]:
+        from importer import import_command
+        return import_command(argv[1:])
+    if argv[:1] == ["export"]:
+        from exporter import export_command
+        return export_command(argv[1:])
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except BrokenPipeError:
+        # Output was piped into something that stopped reading (head, fzf)
+        import os
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
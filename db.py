@@ -1,13 +1,129 @@
 import sqlite3
 import os
+import itertools
+import heapq
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
 
 DB_PATH = "bookmarks.db"
 
+COLORS = ["red", "green", "yellow", "blue", "magenta", "cyan", "white"]
+# Folder names hold the full path ("Dev / Python"); parent_id links each
+# folder to the one named by the path minus its last part
+FOLDER_SEPARATOR = " / "
+
+_conn = None
+CONNECT_HOOKS = []
+# Called with the ids of bookmarks changed by a committed write, or None when
+# too much changed to list (imports)
+CHANGE_HOOKS = []
+_write_lock = threading.RLock()
+# BEGIN IMMEDIATE attempts when another process holds the write lock past busy_timeout
+WRITE_RETRIES = 5
+WRITE_BACKOFF = 0.05
+CHANGE_LOG_SIZE = 10000
+# Fetched titles are re-checked (conditionally) after REFRESH_TTL; failed
+# fetches are retried after FAILURE_TTL, doubling per consecutive failure
+REFRESH_TTL = 30 * 86400
+FAILURE_TTL = 3600
+FAILURE_TTL_MAX = 7 * 86400
+# bookmarks.health values, ordered so that sorting descending puts the worst
+# links first; HEALTH_NAMES[value] is the label
+HEALTH_UNCHECKED, HEALTH_OK, HEALTH_REDIRECTED, HEALTH_ERROR, HEALTH_BROKEN = range(5)
+HEALTH_NAMES = ["unchecked", "ok", "redirected", "error", "broken"]
+# Page archive mode: None (off), "text" or "html" (text plus markup); set
+# with --archive or LINKDB_ARCHIVE. Text beyond ARCHIVE_MAX_TEXT characters
+# is cut, markup over ARCHIVE_MAX_HTML bytes is dropped, and nothing new is
+# stored once the compressed archive reaches ARCHIVE_MAX_TOTAL bytes.
+ARCHIVE = None
+ARCHIVE_MAX_TEXT = 256 * 1024
+ARCHIVE_MAX_HTML = 1024 * 1024
+ARCHIVE_MAX_TOTAL = 512 * 1024 * 1024
+# Frecency: each visit counts 1, halving every FRECENCY_HALF_LIFE seconds;
+# saving a bookmark counts as half a visit
+FRECENCY_HALF_LIFE = 30 * 86400
+# Bumped after every write so caches built on query results know they are stale
+_generation = 0
+
+def get_connection():
+    global _conn
+    if _conn is None:
+        # One long-lived connection; sqlite3 keeps compiled statements per SQL string
+        _conn = sqlite3.connect(DB_PATH, timeout=5.0, cached_statements=256, check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("PRAGMA synchronous=NORMAL")
+        _conn.execute("PRAGMA busy_timeout=5000")
+        _conn.create_function("frecency_add", 2, frecency_add, deterministic=True)
+        for hook in CONNECT_HOOKS:
+            hook(_conn)
+    return _conn
+
+def frecency_add(score, when):
+    # Scores are stored as log2 of the decayed visit sum, scaled to seconds:
+    # half_life * log2(sum of 2 ** (t / half_life)) over all visits t. Time
+    # shifts every score equally, so they stay comparable without ever being
+    # recomputed, and a visit only needs the current score.
+    if score is None:
+        return when
+    high, low = max(score, when), min(score, when)
+    return high + FRECENCY_HALF_LIFE * math.log2(1 + 2 ** ((low - high) / FRECENCY_HALF_LIFE))
+
+def initial_frecency(created_at, last_visited=0, visit_count=0):
+    score = created_at - FRECENCY_HALF_LIFE
+    if visit_count:
+        # Past visits are only known by count and last time; date them all then
+        score = frecency_add(score, last_visited + FRECENCY_HALF_LIFE * math.log2(visit_count))
+    return score
+
+def close_db():
+    global _conn
+    if _conn is not None:
+        _conn.close()
+        _conn = None
+
+def notify_change(ids):
+    for hook in CHANGE_HOOKS:
+        hook(ids)
+
+def begin_write(conn):
+    # Take the write lock up front so contention with other processes shows up
+    # here, where it can be retried, instead of halfway through a transaction
+    import random
+    for attempt in range(WRITE_RETRIES):
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            return
+        except sqlite3.OperationalError as e:
+            if attempt == WRITE_RETRIES - 1 or not ("locked" in str(e) or "busy" in str(e)):
+                raise
+            time.sleep(WRITE_BACKOFF * 2 ** attempt * (1 + random.random()))
+
+@contextmanager
+def transaction():
+    # Background workers share the connection, so writes are serialized here
+    global _generation
+    conn = get_connection()
+    with _write_lock:
+        try:
+            if not conn.in_transaction:
+                begin_write(conn)
+            with conn:
+                yield conn
+        finally:
+            _generation += 1
+
 def init_db():
+    directory = os.path.dirname(os.path.abspath(DB_PATH))
+    os.makedirs(directory, exist_ok=True)
     if not os.path.exists(DB_PATH):
         open(DB_PATH, 'w').close()
-        
-    conn = sqlite3.connect(DB_PATH)
+
+    conn = get_connection()
     c = conn.cursor()
     c.execute('''
         CREATE TABLE IF NOT EXISTS folders (
@@ -27,63 +143,1211 @@ def init_db():
         )
     ''')
     conn.commit()
-    conn.close()
 
-def migrate_add_color_and_tags_column():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
+def migrate_add_color_and_tags_column(c):
     c.execute("PRAGMA table_info(bookmarks)")
     columns = [row[1] for row in c.fetchall()]
     if "color" not in columns:
         c.execute("ALTER TABLE bookmarks ADD COLUMN color TEXT")
-        conn.commit()
     if "tags" not in columns:
         c.execute("ALTER TABLE bookmarks ADD COLUMN tags TEXT")
-        conn.commit()
-    conn.close()
+
+def migrate_add_title_status_column(c):
+    c.execute("ALTER TABLE bookmarks ADD COLUMN title_status TEXT NOT NULL DEFAULT 'done'")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_bookmarks_pending ON bookmarks(id) WHERE title_status = 'pending'")
+
+def migrate_add_fts_index(c):
+    # External-content FTS5 index over bookmarks, kept in sync by triggers
+    c.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS bookmarks_fts USING fts5(
+            title, url, tags,
+            content='bookmarks', content_rowid='id',
+            prefix='2 3'
+        )
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS bookmarks_fts_insert AFTER INSERT ON bookmarks BEGIN
+            INSERT INTO bookmarks_fts(rowid, title, url, tags) VALUES (new.id, new.title, new.url, new.tags);
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS bookmarks_fts_delete AFTER DELETE ON bookmarks BEGIN
+            INSERT INTO bookmarks_fts(bookmarks_fts, rowid, title, url, tags) VALUES ('delete', old.id, old.title, old.url, old.tags);
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS bookmarks_fts_update AFTER UPDATE OF title, url, tags ON bookmarks BEGIN
+            INSERT INTO bookmarks_fts(bookmarks_fts, rowid, title, url, tags) VALUES ('delete', old.id, old.title, old.url, old.tags);
+            INSERT INTO bookmarks_fts(rowid, title, url, tags) VALUES (new.id, new.title, new.url, new.tags);
+        END
+    ''')
+    c.execute("INSERT INTO bookmarks_fts(bookmarks_fts) VALUES ('rebuild')")
+
+def migrate_add_tag_tables(c):
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS tags (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS bookmark_tags (
+            bookmark_id INTEGER NOT NULL,
+            tag_id INTEGER NOT NULL,
+            PRIMARY KEY(bookmark_id, tag_id)
+        ) WITHOUT ROWID
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_bookmark_tags_tag ON bookmark_tags(tag_id, bookmark_id)")
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS bookmark_tags_delete AFTER DELETE ON bookmarks BEGIN
+            DELETE FROM bookmark_tags WHERE bookmark_id = old.id;
+        END
+    ''')
+    rows = c.execute("SELECT id, tags FROM bookmarks WHERE tags IS NOT NULL AND tags != ''").fetchall()
+    for bid, tags in rows:
+        set_tags(c, bid, tags)
+
+def migrate_add_sort_columns(c):
+    c.execute("ALTER TABLE bookmarks ADD COLUMN created_at INTEGER NOT NULL DEFAULT 0")
+    c.execute("ALTER TABLE bookmarks ADD COLUMN last_visited INTEGER NOT NULL DEFAULT 0")
+    c.execute("ALTER TABLE bookmarks ADD COLUMN visit_count INTEGER NOT NULL DEFAULT 0")
+    c.execute("UPDATE bookmarks SET created_at = ?", (int(time.time()),))
+    # One index per sort mode, matching the ORDER BY expressions in SORT_ORDERS
+    c.execute("CREATE INDEX IF NOT EXISTS idx_bookmarks_title ON bookmarks(IFNULL(title, '') COLLATE NOCASE, id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_bookmarks_created ON bookmarks(created_at, id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_bookmarks_visited ON bookmarks(last_visited, id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_bookmarks_visits ON bookmarks(visit_count, id)")
+
+def migrate_add_url_key(c):
+    c.execute("ALTER TABLE bookmarks ADD COLUMN url_key TEXT")
+    seen = set()
+    keys = []
+    for bid, url in c.execute("SELECT id, url FROM bookmarks ORDER BY id").fetchall():
+        key = normalize_url(url)
+        # Existing duplicates keep a NULL key; they are still reachable by id
+        if key not in seen:
+            seen.add(key)
+            keys.append((key, bid))
+    c.executemany("UPDATE bookmarks SET url_key = ? WHERE id = ?", keys)
+    c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_bookmarks_url_key ON bookmarks(url_key)")
+
+def migrate_add_trigram_index(c):
+    # Trigram index for typo-tolerant search. Only single trigrams are ever
+    # matched, so detail='none' is enough and keeps the index small.
+    c.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS bookmarks_trigram USING fts5(
+            title, url, tags,
+            content='bookmarks', content_rowid='id',
+            tokenize='trigram', detail='none'
+        )
+    ''')
+    c.execute("CREATE VIRTUAL TABLE IF NOT EXISTS bookmarks_trigram_vocab USING fts5vocab(bookmarks_trigram, 'row')")
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS bookmarks_trigram_insert AFTER INSERT ON bookmarks BEGIN
+            INSERT INTO bookmarks_trigram(rowid, title, url, tags) VALUES (new.id, new.title, new.url, new.tags);
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS bookmarks_trigram_delete AFTER DELETE ON bookmarks BEGIN
+            INSERT INTO bookmarks_trigram(bookmarks_trigram, rowid, title, url, tags) VALUES ('delete', old.id, old.title, old.url, old.tags);
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS bookmarks_trigram_update AFTER UPDATE OF title, url, tags ON bookmarks BEGIN
+            INSERT INTO bookmarks_trigram(bookmarks_trigram, rowid, title, url, tags) VALUES ('delete', old.id, old.title, old.url, old.tags);
+            INSERT INTO bookmarks_trigram(rowid, title, url, tags) VALUES (new.id, new.title, new.url, new.tags);
+        END
+    ''')
+    c.execute("INSERT INTO bookmarks_trigram(bookmarks_trigram) VALUES ('rebuild')")
+
+def migrate_add_change_log(c):
+    # Every change to a bookmark is logged so other running instances can pick
+    # up just the changed rows; entries older than CHANGE_LOG_SIZE are pruned
+    c.execute("CREATE TABLE IF NOT EXISTS bookmark_changes (seq INTEGER PRIMARY KEY AUTOINCREMENT, bookmark_id INTEGER NOT NULL)")
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS bookmark_changes_insert AFTER INSERT ON bookmarks BEGIN
+            INSERT INTO bookmark_changes (bookmark_id) VALUES (new.id);
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS bookmark_changes_update AFTER UPDATE ON bookmarks BEGIN
+            INSERT INTO bookmark_changes (bookmark_id) VALUES (new.id);
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS bookmark_changes_delete AFTER DELETE ON bookmarks BEGIN
+            INSERT INTO bookmark_changes (bookmark_id) VALUES (old.id);
+        END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS bookmark_changes_prune AFTER INSERT ON bookmark_changes WHEN new.seq % 1000 = 0 BEGIN
+            DELETE FROM bookmark_changes WHERE seq <= new.seq - {CHANGE_LOG_SIZE};
+        END
+    ''')
+
+def migrate_add_folder_tree(c):
+    c.execute("ALTER TABLE folders ADD COLUMN parent_id INTEGER REFERENCES folders(id)")
+    # Bookmarks directly in the folder; subtree totals sum this over folder_tree
+    c.execute("ALTER TABLE folders ADD COLUMN bookmark_count INTEGER NOT NULL DEFAULT 0")
+    cache = {}
+    for folder_id, name in c.execute("SELECT id, name FROM folders ORDER BY id").fetchall():
+        cache[name] = folder_id
+        parent = name.rpartition(FOLDER_SEPARATOR)[0]
+        if parent:
+            c.execute("UPDATE folders SET parent_id = ? WHERE id = ?", (folder_id_for_path(c, parent, cache), folder_id))
+    c.execute("CREATE INDEX IF NOT EXISTS idx_folders_parent ON folders(parent_id, name)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_bookmarks_folder ON bookmarks(folder_id, id)")
+    c.execute("UPDATE folders SET bookmark_count = (SELECT COUNT(*) FROM bookmarks WHERE folder_id = folders.id)")
+
+    # Closure table: one row per (ancestor, descendant) pair, including each
+    # folder with itself at depth 0
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS folder_tree (
+            ancestor_id INTEGER NOT NULL,
+            descendant_id INTEGER NOT NULL,
+            depth INTEGER NOT NULL,
+            PRIMARY KEY (ancestor_id, descendant_id)
+        ) WITHOUT ROWID
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_folder_tree_descendant ON folder_tree(descendant_id)")
+    c.execute('''
+        INSERT INTO folder_tree (ancestor_id, descendant_id, depth)
+        WITH RECURSIVE tree(ancestor_id, descendant_id, depth) AS (
+            SELECT id, id, 0 FROM folders
+            UNION ALL
+            SELECT tree.ancestor_id, f.id, tree.depth + 1 FROM tree JOIN folders f ON f.parent_id = tree.descendant_id
+        )
+        SELECT ancestor_id, descendant_id, depth FROM tree
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS folder_tree_insert AFTER INSERT ON folders BEGIN
+            INSERT INTO folder_tree (ancestor_id, descendant_id, depth)
+            SELECT ancestor_id, new.id, depth + 1 FROM folder_tree WHERE descendant_id = new.parent_id
+            UNION ALL SELECT new.id, new.id, 0;
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS folder_tree_delete AFTER DELETE ON folders BEGIN
+            DELETE FROM folder_tree WHERE descendant_id = old.id;
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS folder_count_insert AFTER INSERT ON bookmarks WHEN new.folder_id IS NOT NULL BEGIN
+            UPDATE folders SET bookmark_count = bookmark_count + 1 WHERE id = new.folder_id;
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS folder_count_delete AFTER DELETE ON bookmarks WHEN old.folder_id IS NOT NULL BEGIN
+            UPDATE folders SET bookmark_count = bookmark_count - 1 WHERE id = old.folder_id;
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS folder_count_update AFTER UPDATE OF folder_id ON bookmarks WHEN old.folder_id IS NOT new.folder_id BEGIN
+            UPDATE folders SET bookmark_count = bookmark_count - 1 WHERE id = old.folder_id;
+            UPDATE folders SET bookmark_count = bookmark_count + 1 WHERE id = new.folder_id;
+        END
+    ''')
+
+def migrate_add_url_hash(c):
+    # Duplicates are found through a 64-bit hash of the canonical URL; its
+    # index is a fraction of the size of the text url_key index it replaces.
+    # Rows that canonicalize to the same URL now share a hash; `linkdb dedupe`
+    # merges them.
+    c.execute("ALTER TABLE bookmarks ADD COLUMN url_hash INTEGER")
+    rows = c.execute("SELECT id, url FROM bookmarks").fetchall()
+    c.executemany("UPDATE bookmarks SET url_hash = ? WHERE id = ?", [(url_hash(url), bid) for bid, url in rows])
+    c.execute("DROP INDEX IF EXISTS idx_bookmarks_url_key")
+    if sqlite3.sqlite_version_info >= (3, 35, 0):
+        c.execute("ALTER TABLE bookmarks DROP COLUMN url_key")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_bookmarks_url_hash ON bookmarks(url_hash)")
+
+def migrate_add_page_meta(c):
+    # One row per bookmark: HTTP validators and outcome of the last title fetch
+    # and when to fetch again. title is the fetched title last written to the
+    # bookmark, so a refresh never overwrites a title edited since.
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS page_meta (
+            bookmark_id INTEGER PRIMARY KEY,
+            title TEXT,
+            etag TEXT,
+            last_modified TEXT,
+            status INTEGER,
+            error TEXT,
+            fetched_at INTEGER,
+            next_fetch INTEGER NOT NULL,
+            failures INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_page_meta_next ON page_meta(next_fetch)")
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS page_meta_delete AFTER DELETE ON bookmarks BEGIN
+            DELETE FROM page_meta WHERE bookmark_id = old.id;
+        END
+    ''')
+    # Placeholder titles are due now; the rest are spread over one TTL so
+    # they don't all come due on the same day
+    now = int(time.time())
+    c.execute('''
+        INSERT OR IGNORE INTO page_meta (bookmark_id, next_fetch)
+        SELECT id, CASE WHEN title_status = 'pending' OR title IS NULL OR title = url THEN 0 ELSE ? + id % ? END FROM bookmarks
+    ''', (now, REFRESH_TTL))
+
+def migrate_add_link_health(c):
+    # Result of the last link check; bookmarks.health holds just its class so
+    # the list can be sorted and filtered on it through an index
+    c.execute("ALTER TABLE bookmarks ADD COLUMN health INTEGER NOT NULL DEFAULT 0")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_bookmarks_health ON bookmarks(health, id)")
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS link_health (
+            bookmark_id INTEGER PRIMARY KEY,
+            status INTEGER NOT NULL,
+            final_url TEXT,
+            redirects INTEGER NOT NULL DEFAULT 0,
+            latency_ms INTEGER,
+            error TEXT,
+            checked_at INTEGER NOT NULL
+        )
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS link_health_delete AFTER DELETE ON bookmarks BEGIN
+            DELETE FROM link_health WHERE bookmark_id = old.id;
+        END
+    ''')
+
+def migrate_add_page_archive(c):
+    # Captured pages are stored once per distinct content, keyed by its hash
+    # and zlib-compressed; refs counts the bookmarks pointing at each one.
+    # page_text_fts is contentless, so deleting from it needs the text.
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS page_content (
+            id INTEGER PRIMARY KEY,
+            hash BLOB NOT NULL UNIQUE,
+            text BLOB NOT NULL,
+            html BLOB,
+            size INTEGER NOT NULL,
+            stored_size INTEGER NOT NULL,
+            refs INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_page_content_size ON page_content(stored_size)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_page_content_unused ON page_content(id) WHERE refs = 0")
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS bookmark_pages (
+            bookmark_id INTEGER PRIMARY KEY,
+            content_id INTEGER NOT NULL,
+            captured_at INTEGER NOT NULL
+        )
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_bookmark_pages_content ON bookmark_pages(content_id)")
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS bookmark_pages_insert AFTER INSERT ON bookmark_pages BEGIN
+            UPDATE page_content SET refs = refs + 1 WHERE id = new.content_id;
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS bookmark_pages_delete AFTER DELETE ON bookmark_pages BEGIN
+            UPDATE page_content SET refs = refs - 1 WHERE id = old.content_id;
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS bookmark_pages_update AFTER UPDATE OF content_id ON bookmark_pages WHEN old.content_id != new.content_id BEGIN
+            UPDATE page_content SET refs = refs - 1 WHERE id = old.content_id;
+            UPDATE page_content SET refs = refs + 1 WHERE id = new.content_id;
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS bookmark_pages_bookmark_delete AFTER DELETE ON bookmarks BEGIN
+            DELETE FROM bookmark_pages WHERE bookmark_id = old.id;
+        END
+    ''')
+    c.execute("CREATE VIRTUAL TABLE IF NOT EXISTS page_text_fts USING fts5(text, content='', detail='none')")
+
+def migrate_add_frecency(c):
+    c.execute("ALTER TABLE bookmarks ADD COLUMN frecency REAL NOT NULL DEFAULT 0")
+    rows = c.execute("SELECT id, created_at, last_visited, visit_count FROM bookmarks").fetchall()
+    c.executemany("UPDATE bookmarks SET frecency = ? WHERE id = ?", [(initial_frecency(*row[1:]), row[0]) for row in rows])
+    c.execute("CREATE INDEX IF NOT EXISTS idx_bookmarks_frecency ON bookmarks(frecency, id)")
+
+def migrate_add_archive_totals(c):
+    # Running totals over page_content, kept by triggers so the archive size
+    # cap is checked without summing the table
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS archive_totals (
+            id INTEGER PRIMARY KEY CHECK (id = 0),
+            pages INTEGER NOT NULL,
+            size INTEGER NOT NULL,
+            stored_size INTEGER NOT NULL
+        )
+    ''')
+    c.execute("INSERT OR REPLACE INTO archive_totals SELECT 0, COUNT(*), IFNULL(SUM(size), 0), IFNULL(SUM(stored_size), 0) FROM page_content")
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS archive_totals_insert AFTER INSERT ON page_content BEGIN
+            UPDATE archive_totals SET pages = pages + 1, size = size + new.size, stored_size = stored_size + new.stored_size;
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS archive_totals_delete AFTER DELETE ON page_content BEGIN
+            UPDATE archive_totals SET pages = pages - 1, size = size - old.size, stored_size = stored_size - old.stored_size;
+        END
+    ''')
+
+# Schema steps in order; PRAGMA user_version records how many have been applied
+MIGRATIONS = [
+    migrate_add_color_and_tags_column,
+    migrate_add_title_status_column,
+    migrate_add_fts_index,
+    migrate_add_tag_tables,
+    migrate_add_sort_columns,
+    migrate_add_url_key,
+    migrate_add_trigram_index,
+    migrate_add_change_log,
+    migrate_add_folder_tree,
+    migrate_add_url_hash,
+    migrate_add_page_meta,
+    migrate_add_link_health,
+    migrate_add_page_archive,
+    migrate_add_frecency,
+    migrate_add_archive_totals,
+]
+
+def migrate_db():
+    conn = get_connection()
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= len(MIGRATIONS):
+        return
+    while True:
+        with _write_lock:
+            begin_write(conn)
+            try:
+                # Read the version under the write lock: another instance
+                # starting at the same time may have just applied this step
+                version = conn.execute("PRAGMA user_version").fetchone()[0]
+                if version >= len(MIGRATIONS):
+                    conn.commit()
+                    return
+                c = conn.cursor()
+                MIGRATIONS[version](c)
+                c.execute(f"PRAGMA user_version = {version + 1}")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+TRACKING_PARAMS = {"fbclid", "gclid", "dclid", "msclkid", "yclid", "igshid", "mc_cid", "mc_eid", "_ga", "_hsenc", "_hsmkt"}
+
+def normalize_url(url):
+    # Canonical form used to spot the same page saved twice: http and https,
+    # www., default ports, a trailing slash, tracking parameters, parameter
+    # order and plain #anchors don't make a URL different
+    from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+    url = (url or "").strip()
+    try:
+        parts = urlsplit(url)
+        if not parts.scheme and not parts.netloc:
+            # Pasted without a scheme ("example.com/page")
+            parts = urlsplit("https://" + url)
+    except ValueError:
+        # Malformed ("http://[abc"); only identical strings match
+        return url.lower()
+    scheme = parts.scheme.lower()
+    userinfo, _, host = parts.netloc.rpartition("@")
+    host = host.lower()
+    if (scheme, host.rpartition(":")[2]) in (("http", "80"), ("https", "443")):
+        host = host.rpartition(":")[0]
+    if scheme == "http":
+        scheme = "https"
+    if host.startswith("www."):
+        host = host[4:]
+    netloc = f"{userinfo}@{host}" if userinfo else host
+    path = parts.path.rstrip("/")
+    params = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith("utm_") and key.lower() not in TRACKING_PARAMS
+    )
+    # Hash-bang and "#/route" fragments address app state, so they are kept
+    fragment = parts.fragment if parts.fragment.startswith(("!", "/")) else ""
+    return urlunsplit((scheme, netloc, path, urlencode(params), fragment))
+
+def url_hash(url):
+    # 64-bit key for the url_hash index; matches are confirmed on the canonical URL
+    import hashlib
+    digest = hashlib.blake2b(normalize_url(url).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+def split_tags(tags):
+    names = []
+    for tag in (tags or '').replace(';', ',').replace(' ', ',').split(','):
+        tag = tag.strip()
+        if tag and tag not in names:
+            names.append(tag)
+    return names
+
+def set_tags(c, bookmark_id, tags):
+    # Mirror the bookmark's tag string into the normalized tag tables
+    names = split_tags(tags)
+    c.execute("DELETE FROM bookmark_tags WHERE bookmark_id = ?", (bookmark_id,))
+    c.executemany("INSERT OR IGNORE INTO tags (name) VALUES (?)", [(name,) for name in names])
+    c.executemany(
+        "INSERT OR IGNORE INTO bookmark_tags (bookmark_id, tag_id) SELECT ?, id FROM tags WHERE name = ?",
+        [(bookmark_id, name) for name in names],
+    )
+
+def folder_id_for_path(conn, path, cache=None):
+    # Id of the folder at path, creating it and any missing parents
+    cache = {} if cache is None else cache
+    folder_id = cache.get(path)
+    if folder_id is None:
+        row = conn.execute("SELECT id FROM folders WHERE name = ?", (path,)).fetchone()
+        if row:
+            folder_id = row[0]
+        else:
+            parent = path.rpartition(FOLDER_SEPARATOR)[0]
+            parent_id = folder_id_for_path(conn, parent, cache) if parent else None
+            folder_id = conn.execute("INSERT INTO folders (name, parent_id) VALUES (?, ?)", (path, parent_id)).lastrowid
+        cache[path] = folder_id
+    return folder_id
+
+def get_folder_children(parent_id=None):
+    # (id, label, bookmarks in subtree, has subfolders) for one level of the tree
+    conn = get_connection()
+    rows = conn.execute('''
+        SELECT f.id, f.name,
+            (SELECT SUM(d.bookmark_count) FROM folder_tree t JOIN folders d ON d.id = t.descendant_id WHERE t.ancestor_id = f.id),
+            EXISTS (SELECT 1 FROM folders c WHERE c.parent_id = f.id)
+        FROM folders f WHERE f.parent_id IS ?
+        ORDER BY f.name
+    ''', (parent_id,)).fetchall()
+    return [(fid, name.rpartition(FOLDER_SEPARATOR)[2], count or 0, bool(children)) for fid, name, count, children in rows]
+
+def get_folder_bookmarks(folder_id, after_id=None, limit=200):
+    # Bookmarks directly in the folder, in id order, one page at a time
+    conn = get_connection()
+    return conn.execute(
+        "SELECT id, url, title, folder_id, color, tags FROM bookmarks WHERE folder_id = ? AND id > ? ORDER BY id LIMIT ?",
+        (folder_id, after_id or 0, limit),
+    ).fetchall()
 
 def get_folders_and_bookmarks():
-    migrate_add_color_and_tags_column()
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection()
     c = conn.cursor()
     c.execute("SELECT id, name FROM folders ORDER BY name")
     folders = c.fetchall()
     c.execute("SELECT id, url, title, folder_id, color, tags FROM bookmarks ORDER BY id DESC")
     bookmarks = c.fetchall()
-    conn.close()
     return folders, bookmarks
 
+# Queries whose words are all shorter than this skip bm25 ranking
+RANKED_PREFIX_MIN = 3
+
+def fts_query(query):
+    # Every word must match as a prefix of some token in title, url or tags
+    words = (query or "").split()
+    return " ".join('"' + word.replace('"', '""') + '"*' for word in words)
+
+def text_query(query):
+    # The page text index keeps no positions, so every token is its own prefix term
+    return " ".join(f'"{token}"*' for token in TOKEN_RE.findall(query or ""))
+
+def search_bookmarks(query, limit=200):
+    return _search(query, limit)[0]
+
+def _search(query, limit):
+    # (rows, narrowable): title/url/tag matches by rank, then bookmarks whose
+    # archived page text matches. narrowable is True only when rows holds every
+    # match and the page text index was asked and had none, so narrower queries
+    # can be answered by filtering rows (see search_from_cache).
+    conn = get_connection()
+    match = fts_query(query)
+    if not match:
+        return conn.execute("SELECT id, url, title, folder_id, color, tags FROM bookmarks ORDER BY id DESC LIMIT ?", (limit,)).fetchall(), False
+    if all(len(word) < RANKED_PREFIX_MIN for word in query.split()):
+        # A prefix this short matches much of the table, and ranking would
+        # score every match; the prefix index gives the newest ones instead
+        return conn.execute('''
+            SELECT b.id, b.url, b.title, b.folder_id, b.color, b.tags
+            FROM (SELECT rowid FROM bookmarks_fts WHERE bookmarks_fts MATCH ? ORDER BY rowid DESC LIMIT ?) f
+            JOIN bookmarks b ON b.id = f.rowid
+            ORDER BY f.rowid DESC
+        ''', (match, limit)).fetchall(), False
+    rows = conn.execute('''
+        SELECT b.id, b.url, b.title, b.folder_id, b.color, b.tags
+        FROM bookmarks_fts JOIN bookmarks b ON b.id = bookmarks_fts.rowid
+        WHERE bookmarks_fts MATCH ?
+        ORDER BY bm25(bookmarks_fts, 10.0, 2.0, 5.0)
+        LIMIT ?
+    ''', (match, limit)).fetchall()
+    match = text_query(query)
+    if len(rows) >= limit or not match:
+        return rows, False
+    text_rows = conn.execute('''
+        SELECT b.id, b.url, b.title, b.folder_id, b.color, b.tags
+        FROM (SELECT rowid, rank FROM page_text_fts WHERE page_text_fts MATCH ? ORDER BY rank LIMIT ?) f
+        JOIN bookmark_pages p ON p.content_id = f.rowid
+        JOIN bookmarks b ON b.id = p.bookmark_id
+        ORDER BY f.rank
+    ''', (match, limit)).fetchall()
+    seen = {row[0] for row in rows}
+    rows += [row for row in text_rows if row[0] not in seen][:limit - len(rows)]
+    return rows, not text_rows
+
+# Recent search results, most recently used last. A query that only adds words
+# or extends existing ones matches a subset of an earlier query's rows, so when
+# that earlier result was not cut off by the limit it is filtered in Python
+# instead of running the FTS query again. Rows found through page text can't
+# be rechecked that way, so only results whose text search came back empty
+# are narrowed; the empty-query and short-prefix results never ask the text
+# index, so they aren't either.
+SEARCH_CACHE_SIZE = 32
+TOKEN_RE = re.compile(r"[^\W_]+")
+_search_cache = OrderedDict()
+_search_cache_generation = 0
+_search_lock = threading.Lock()
+
+def fold_text(text):
+    # Approximates the unicode61 tokenizer: lower case, diacritics removed
+    text = unicodedata.normalize("NFKD", (text or "").lower())
+    return "".join(ch for ch in text if not unicodedata.combining(ch))
+
+def _row_matches(row, words):
+    tokens = TOKEN_RE.findall(fold_text(f"{row[2] or ''} {row[1]} {row[5] or ''}"))
+    return all(any(token.startswith(word) for token in tokens) for word in words)
+
+def search_from_cache(query, limit=200):
+    # Cheap enough for the UI thread: returns None rather than touching SQLite
+    global _search_cache_generation
+    key = " ".join((query or "").split())
+    with _search_lock:
+        if _search_cache_generation != _generation:
+            _search_cache.clear()
+            _search_cache_generation = _generation
+        entry = _search_cache.get((key, limit))
+        if entry is not None:
+            _search_cache.move_to_end((key, limit))
+            return entry[0]
+        words = [fold_text(word) for word in key.split()]
+        if not all(TOKEN_RE.fullmatch(word) for word in words):
+            # Punctuated words become FTS phrases; leave those to SQLite
+            return None
+        for (previous, previous_limit), (previous_rows, narrowable) in reversed(_search_cache.items()):
+            if previous_limit != limit or len(previous_rows) >= limit or not narrowable:
+                continue
+            previous_words = [fold_text(word) for word in previous.split()]
+            if all(any(word.startswith(old) for word in words) for old in previous_words):
+                rows = [row for row in previous_rows if _row_matches(row, words)]
+                break
+        else:
+            return None
+    _store_search(key, limit, rows, True)
+    return rows
+
+def _store_search(key, limit, rows, narrowable):
+    with _search_lock:
+        _search_cache[(key, limit)] = (rows, narrowable)
+        _search_cache.move_to_end((key, limit))
+        while len(_search_cache) > SEARCH_CACHE_SIZE:
+            _search_cache.popitem(last=False)
+
+def search_bookmarks_cached(query, limit=200):
+    rows = search_from_cache(query, limit)
+    if rows is None:
+        key = " ".join((query or "").split())
+        rows, narrowable = _search(key, limit)
+        _store_search(key, limit, rows, narrowable)
+    return rows
+
+# Fuzzy search: candidates are the rows sharing the most query trigrams,
+# counted from the trigram index starting with the rarest trigrams until a
+# postings budget is spent. They are then rescored in Python by the share of
+# query trigrams each field contains, with a boost for recently added or
+# visited bookmarks.
+FUZZY_MAX_POSTINGS = 200000
+FUZZY_CANDIDATES = 1000
+FUZZY_MIN_SIMILARITY = 0.4
+FUZZY_RECENCY_WEIGHT = 0.2
+FUZZY_RECENCY_HALF_LIFE = 90 * 86400
+
+def trigrams(text):
+    text = (text or "").lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+def fuzzy_search(query, limit=50):
+    grams = set()
+    for word in (query or "").split():
+        grams |= trigrams(word)
+    if not grams:
+        return []
+    conn = get_connection()
+    placeholders = ", ".join("?" for _ in grams)
+    counts = conn.execute(f"SELECT term, doc FROM bookmarks_trigram_vocab WHERE term IN ({placeholders})", list(grams)).fetchall()
+    hits = Counter()
+    postings = 0
+    for term, doc in sorted(counts, key=lambda t: t[1]):
+        # Common trigrams (".co", "htt") match most rows and add little
+        if hits and postings + doc > FUZZY_MAX_POSTINGS:
+            break
+        postings += doc
+        hits.update(rowid for rowid, in conn.execute("SELECT rowid FROM bookmarks_trigram WHERE bookmarks_trigram MATCH ?", ('"' + term.replace('"', '""') + '"',)))
+    ids = [bid for bid, _ in heapq.nlargest(FUZZY_CANDIDATES, hits.items(), key=lambda item: (item[1], item[0]))]
+    if not ids:
+        return []
+    placeholders = ", ".join("?" for _ in ids)
+    candidates = conn.execute(f"SELECT id, url, title, folder_id, color, tags, created_at, last_visited FROM bookmarks WHERE id IN ({placeholders})", ids).fetchall()
+
+    from urllib.parse import urlsplit
+    now = time.time()
+    scored = []
+    for row in candidates:
+        url, title, tags = row[1], row[2], row[5]
+        try:
+            host = urlsplit(url).hostname
+        except ValueError:
+            host = None
+        fields = ((1.0, title), (0.9, host), (0.7, url), (0.8, tags))
+        similarity = max(weight * len(grams & trigrams(text)) / len(grams) for weight, text in fields)
+        if similarity < FUZZY_MIN_SIMILARITY:
+            continue
+        age = max(now - max(row[6], row[7]), 0)
+        score = similarity + FUZZY_RECENCY_WEIGHT * 0.5 ** (age / FUZZY_RECENCY_HALF_LIFE)
+        scored.append((score, row[0], row[:6]))
+    return [row for score, bid, row in heapq.nlargest(limit, scored)]
+
+def quick_open(query, limit=10):
+    # Bookmarks whose title, url or tags have a token starting with each query
+    # word, most frecent first
+    conn = get_connection()
+    match = text_query(query)
+    if not match:
+        return conn.execute("SELECT id, url, title, folder_id, color, tags FROM bookmarks ORDER BY frecency DESC, id DESC LIMIT ?", (limit,)).fetchall()
+    return conn.execute('''
+        SELECT b.id, b.url, b.title, b.folder_id, b.color, b.tags
+        FROM bookmarks_fts JOIN bookmarks b ON b.id = bookmarks_fts.rowid
+        WHERE bookmarks_fts MATCH ?
+        ORDER BY b.frecency DESC, b.id DESC
+        LIMIT ?
+    ''', (match, limit)).fetchall()
+
+def get_bookmarks_by_tags(tags, match_all=False):
+    names = split_tags(tags if isinstance(tags, str) else ",".join(tags))
+    if not names:
+        return []
+    conn = get_connection()
+    placeholders = ", ".join("?" for _ in names)
+    having = "HAVING COUNT(*) = ?" if match_all else ""
+    params = names + [len(names)] if match_all else names
+    return conn.execute(f'''
+        SELECT id, url, title, folder_id, color, tags FROM bookmarks
+        WHERE id IN (
+            SELECT bt.bookmark_id FROM bookmark_tags bt JOIN tags t ON t.id = bt.tag_id
+            WHERE t.name IN ({placeholders})
+            GROUP BY bt.bookmark_id {having}
+        )
+        ORDER BY id DESC
+    ''', params).fetchall()
+
+# Sort mode -> (ordering columns ending in id, descending); the columns double as the keyset for paging
+SORT_ORDERS = {
+    "id_asc": (["id"], False),
+    "id_desc": (["id"], True),
+    "title_az": (["IFNULL(title, '') COLLATE NOCASE", "id"], False),
+    "title_za": (["IFNULL(title, '') COLLATE NOCASE", "id"], True),
+    "added_desc": (["created_at", "id"], True),
+    "visited_desc": (["last_visited", "id"], True),
+    "visits_desc": (["visit_count", "id"], True),
+    "health_desc": (["health", "id"], True),
+    "frecency_desc": (["frecency", "id"], True),
+}
+
+# Python equivalents of the SORT_ORDERS that only need the columns in a bookmark row,
+# used to reorder an already loaded page without going back to the database
+SORT_KEYS = {
+    "id_asc": lambda row: (row[0],),
+    "id_desc": lambda row: (row[0],),
+    "title_az": lambda row: ((row[2] or "").lower(), row[0]),
+    "title_za": lambda row: ((row[2] or "").lower(), row[0]),
+}
+
+def get_bookmarks(ids):
+    ids = list(ids)
+    if not ids:
+        return []
+    conn = get_connection()
+    placeholders = ", ".join("?" for _ in ids)
+    return conn.execute(f"SELECT id, url, title, folder_id, color, tags FROM bookmarks WHERE id IN ({placeholders}) ORDER BY id", ids).fetchall()
+
+def get_bookmarks_page(sort="id_asc", after_id=None, before_id=None, limit=100, tag=None, health=None):
+    # Keyset pagination: rows strictly after (or before) the row with the given id
+    # in the requested order, always returned in display order
+    columns, descending = SORT_ORDERS.get(sort, SORT_ORDERS["id_asc"])
+    key = ", ".join(columns)
+    backwards = before_id is not None
+    where = []
+    params = []
+    if after_id is not None or backwards:
+        op = "<" if descending != backwards else ">"
+        boundary = before_id if backwards else after_id
+        if len(columns) > 1:
+            # Bound the leading column on its own too so SQLite can seek the index
+            where.append(f"{columns[0]} {op}= (SELECT {columns[0]} FROM bookmarks WHERE id = ?)")
+            params.append(boundary)
+        where.append(f"({key}) {op} (SELECT {key} FROM bookmarks WHERE id = ?)")
+        params.append(boundary)
+    if tag:
+        where.append("id IN (SELECT bt.bookmark_id FROM bookmark_tags bt JOIN tags t ON t.id = bt.tag_id WHERE t.name = ?)")
+        params.append(tag)
+    if health is not None:
+        where.append("health = ?")
+        params.append(health)
+    direction = "DESC" if descending != backwards else "ASC"
+    order = ", ".join(f"{column} {direction}" for column in columns)
+    where_sql = "WHERE " + " AND ".join(where) if where else ""
+    conn = get_connection()
+    rows = conn.execute(
+        f"SELECT id, url, title, folder_id, color, tags FROM bookmarks {where_sql} ORDER BY {order} LIMIT ?",
+        params + [limit],
+    ).fetchall()
+    if backwards:
+        rows.reverse()
+    return rows
+
+def get_tag_counts():
+    conn = get_connection()
+    return conn.execute('''
+        SELECT t.name, COUNT(*) FROM tags t JOIN bookmark_tags bt ON bt.tag_id = t.id
+        GROUP BY t.id ORDER BY t.name
+    ''').fetchall()
+
+def iter_bookmarks(tag=None, folder=None, order_by_folder=False, chunk_size=1000):
+    # Yields (id, url, title, folder, tags, created_at) straight off the cursor,
+    # chunk_size rows at a time, so exports never hold the whole table
+    where = []
+    params = []
+    if tag:
+        where.append("b.id IN (SELECT bt.bookmark_id FROM bookmark_tags bt JOIN tags t ON t.id = bt.tag_id WHERE t.name = ?)")
+        params.append(tag)
+    if folder:
+        where.append("b.folder_id IN (SELECT t.descendant_id FROM folder_tree t JOIN folders a ON a.id = t.ancestor_id WHERE a.name = ?)")
+        params.append(folder)
+    where_sql = "WHERE " + " AND ".join(where) if where else ""
+    order = "f.name, b.id" if order_by_folder else "b.id"
+    c = get_connection().cursor()
+    c.execute(f'''
+        SELECT b.id, b.url, b.title, f.name, b.tags, b.created_at
+        FROM bookmarks b LEFT JOIN folders f ON f.id = b.folder_id
+        {where_sql} ORDER BY {order}
+    ''', params)
+    while True:
+        rows = c.fetchmany(chunk_size)
+        if not rows:
+            break
+        yield from rows
+
+def get_change_seq():
+    conn = get_connection()
+    return conn.execute("SELECT IFNULL(MAX(seq), 0) FROM bookmark_changes").fetchone()[0]
+
+def get_changes(since_seq, limit=1000):
+    # (last_seq, ids) for changes logged after since_seq by any process; ids is
+    # None when more than limit rows changed or part of the range was pruned
+    global _generation
+    conn = get_connection()
+    first, last, count = conn.execute("SELECT MIN(seq), MAX(seq), COUNT(*) FROM bookmark_changes WHERE seq > ?", (since_seq,)).fetchone()
+    if not count:
+        return since_seq, []
+    _generation += 1
+    if count > limit or first != since_seq + 1:
+        return last, None
+    ids = conn.execute("SELECT DISTINCT bookmark_id FROM bookmark_changes WHERE seq > ? AND seq <= ?", (since_seq, last)).fetchall()
+    return last, [bid for bid, in ids]
+
+def _find(conn, url):
+    # (id, tags) of the oldest row with the same canonical URL, or None
+    key = normalize_url(url)
+    for bid, existing_url, tags in conn.execute("SELECT id, url, tags FROM bookmarks WHERE url_hash = ? ORDER BY id", (url_hash(url),)):
+        if normalize_url(existing_url) == key:
+            return bid, tags
+    return None
+
+def find_bookmark(url):
+    found = _find(get_connection(), url)
+    return found[0] if found else None
+
+def merge_tags(conn, bookmark_id, current, tags):
+    names = split_tags(current)
+    added = [name for name in split_tags(tags) if name not in names]
+    if added:
+        merged = ",".join(names + added)
+        conn.execute("UPDATE bookmarks SET tags = ? WHERE id = ?", (merged, bookmark_id))
+        set_tags(conn, bookmark_id, merged)
+
+def insert_bookmark(conn, url, title, folder_id, color, tags, status="done", created_at=None, page=None):
+    # Returns (id, inserted); for a URL that is already saved the new tags are
+    # merged into the existing row and nothing else changes. page is the
+    # utils.Page the title came from, if it was fetched.
+    found = _find(conn, url)
+    if found:
+        merge_tags(conn, found[0], found[1], tags)
+        return found[0], False
+    now = int(time.time())
+    created_at = created_at or now
+    bid = conn.execute(
+        "INSERT INTO bookmarks (url, url_hash, title, folder_id, color, tags, title_status, created_at, frecency) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (url, url_hash(url), title, folder_id, color, tags, status, created_at, initial_frecency(created_at)),
+    ).lastrowid
+    set_tags(conn, bid, tags)
+    conn.execute("INSERT INTO page_meta (bookmark_id, next_fetch) VALUES (?, ?)", (bid, 0 if status == "pending" else now + REFRESH_TTL))
+    if page is not None:
+        _store_page(conn, bid, page, page.title, 0, now)
+        if page.text is not None:
+            store_capture(conn, bid, page, now)
+    return bid, True
+
 def add_bookmark(url, folder_id=None, title=None, color=None, tags=None):
-    if title is None:
-        from utils import fetch_title
-        title = fetch_title(url)
+    page = None
+    if title is None and find_bookmark(url) is None:
+        # Already saved URLs only get their tags merged; don't fetch them again
+        from utils import fetch_page
+        page = fetch_page(url, capture=ARCHIVE)
+        title = page.title or url
     if color is None:
-        colors = ["red", "green", "yellow", "blue", "magenta", "cyan", "white"]
         import random
-        color = random.choice(colors)
+        color = random.choice(COLORS)
     if tags is None:
         tags = ""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("INSERT INTO bookmarks (url, title, folder_id, color, tags) VALUES (?, ?, ?, ?, ?)", (url, title, folder_id, color, tags))
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        bid, _ = insert_bookmark(conn, url, title, folder_id, color, tags, page=page)
+    notify_change([bid])
+    return bid
 
-def update_bookmark(url, title, color, tags):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("UPDATE bookmarks SET title = ?, color = ?, tags = ? WHERE url = ?", (title, color, tags, url))
-    conn.commit()
-    conn.close()
+def add_bookmarks(urls, folder_id=None, tags=None, fetch=True):
+    # With fetch=False rows are saved at once with the URL as a placeholder
+    # title and marked pending; the refresh scheduler (refresher.py) fetches them.
+    # Returns the ids of the rows actually inserted; URLs that are already
+    # saved (or repeated in urls) only have their tags merged.
+    import random
+    conn = get_connection()
+    new_urls = []
+    keys = set()
+    for url in urls:
+        key = normalize_url(url)
+        if key not in keys:
+            keys.add(key)
+            new_urls.append(url)
+    urls = new_urls
+    if not urls:
+        return []
+    pages = {}
+    if fetch:
+        from utils import iter_pages
+        missing = [url for url in urls if _find(conn, url) is None]
+        pages = dict(iter_pages(((url, url, None, None) for url in missing), capture=ARCHIVE))
+    status = "done" if fetch else "pending"
+    if tags is None:
+        tags = ""
+    ids = []
+    touched = []
+    now = int(time.time())
+    with transaction() as conn:
+        for url in urls:
+            page = pages.get(url)
+            title = page.title if page is not None and page.title else url
+            bid, inserted = insert_bookmark(conn, url, title, folder_id, random.choice(COLORS), tags, status, now, page)
+            touched.append(bid)
+            if inserted:
+                ids.append(bid)
+    notify_change(touched)
+    return ids
 
-def delete_bookmark(url):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("DELETE FROM bookmarks WHERE url = ?", (url,))
-    conn.commit()
-    conn.close()
+def import_bookmarks(records, tags=None, batch_size=5000, progress=None):
+    # records: iterable of (url, title, folder, tags, created_at). Rows without a
+    # title are stored pending so the app resolves them in the background.
+    import random
+    records = iter(records)
+    folder_ids = {}
+    added = skipped = 0
+    while True:
+        batch = list(itertools.islice(records, batch_size))
+        if not batch:
+            break
+        with transaction() as conn:
+            for url, title, folder, record_tags, created_at in batch:
+                folder_id = folder_id_for_path(conn, folder, folder_ids) if folder else None
+                row_tags = ",".join(split_tags(f"{record_tags or ''},{tags or ''}")) or "main"
+                status = "done" if title else "pending"
+                _, inserted = insert_bookmark(conn, url, title or url, folder_id, random.choice(COLORS), row_tags, status, created_at)
+                if inserted:
+                    added += 1
+                else:
+                    skipped += 1
+        if progress:
+            progress(added, skipped)
+    notify_change(None)
+    return added, skipped
+
+def _store_page(conn, bookmark_id, page, title, failures, now):
+    # failures counts the consecutive failed fetches before this one
+    if 200 <= page.status < 400:
+        next_fetch = now + REFRESH_TTL
+        failures = 0
+    else:
+        next_fetch = now + max(min(FAILURE_TTL * 2 ** failures, FAILURE_TTL_MAX), page.retry_after or 0)
+        failures += 1
+    conn.execute('''
+        UPDATE page_meta SET title = IFNULL(?, title), etag = ?, last_modified = ?, status = ?, error = ?,
+            fetched_at = ?, next_fetch = ?, failures = ?
+        WHERE bookmark_id = ?
+    ''', (title, page.etag, page.last_modified, page.status, page.error, now, next_fetch, failures, bookmark_id))
+
+def get_due_pages(limit=200, now=None):
+    # (id, url, etag, last_modified) of bookmarks whose title should be
+    # fetched again: pending and failed ones first, then the stalest. With the
+    # archive on, pages not captured yet are fetched unconditionally.
+    conn = get_connection()
+    validators = "IIF(p.bookmark_id IS NULL, NULL, m.etag), IIF(p.bookmark_id IS NULL, NULL, m.last_modified)" if ARCHIVE else "m.etag, m.last_modified"
+    return conn.execute(f'''
+        SELECT b.id, b.url, {validators}
+        FROM page_meta m JOIN bookmarks b ON b.id = m.bookmark_id
+        LEFT JOIN bookmark_pages p ON p.bookmark_id = b.id
+        WHERE m.next_fetch <= ?
+        ORDER BY m.next_fetch
+        LIMIT ?
+    ''', (int(time.time()) if now is None else now, limit)).fetchall()
+
+def record_pages(results):
+    # results: (id, utils.Page) pairs from fetch_page. Saves the validators
+    # and next fetch time; a new title replaces the bookmark's only when it is
+    # still pending, a placeholder, or the title written by the last fetch.
+    # Returns the (id, title) pairs whose title changed.
+    results = list(results)
+    now = int(time.time())
+    changed = []
+    with transaction() as conn:
+        for bid, page in results:
+            row = conn.execute('''
+                SELECT b.url, b.title, b.title_status, m.title, m.failures
+                FROM bookmarks b JOIN page_meta m ON m.bookmark_id = b.id WHERE b.id = ?
+            ''', (bid,)).fetchone()
+            if row is None:
+                continue
+            url, title, status, fetched, failures = row
+            new_title = title
+            if page.status != 304 and 200 <= page.status < 400:
+                if status == "pending" or title in (None, url) or title == fetched:
+                    new_title = page.title or url
+            if new_title != title or status == "pending":
+                # A failed fetch leaves the URL as the title until a retry succeeds
+                conn.execute("UPDATE bookmarks SET title = ?, title_status = 'done' WHERE id = ?", (new_title or url, bid))
+                if new_title != title:
+                    changed.append((bid, new_title))
+            _store_page(conn, bid, page, page.title if page.title and new_title == page.title else None, failures, now)
+            if page.text is not None:
+                store_capture(conn, bid, page, now)
+        prune_archive(conn)
+    notify_change([bid for bid, _ in changed])
+    return changed
+
+def classify_link(url, link):
+    if link.status in (404, 410):
+        return HEALTH_BROKEN
+    if link.status == 0 or link.status >= 400:
+        return HEALTH_ERROR
+    if link.redirects and normalize_url(link.final_url) != normalize_url(url):
+        return HEALTH_REDIRECTED
+    return HEALTH_OK
+
+def get_links_to_check(after_id=0, checked_before=None, limit=1000):
+    # (id, url) in id order after after_id, skipping links checked since
+    # checked_before; walk the table by passing the last id back in
+    conn = get_connection()
+    return conn.execute('''
+        SELECT b.id, b.url FROM bookmarks b LEFT JOIN link_health h ON h.bookmark_id = b.id
+        WHERE b.id > ? AND (h.checked_at IS NULL OR h.checked_at < ?)
+        ORDER BY b.id LIMIT ?
+    ''', (after_id, int(time.time()) if checked_before is None else checked_before, limit)).fetchall()
+
+def record_link_health(results):
+    # results: (id, utils.Link) pairs from check_link. Returns (id, health)
+    # for each bookmark still present.
+    results = list(results)
+    now = int(time.time())
+    recorded = []
+    with transaction() as conn:
+        urls = dict(conn.execute(
+            f"SELECT id, url FROM bookmarks WHERE id IN ({', '.join('?' for _ in results)})", [bid for bid, _ in results]
+        ).fetchall()) if results else {}
+        rows = []
+        for bid, link in results:
+            if bid in urls:
+                recorded.append((bid, classify_link(urls[bid], link)))
+                rows.append((bid, link.status, link.final_url, link.redirects, link.latency_ms, link.error, now))
+        conn.executemany("INSERT OR REPLACE INTO link_health VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        # Only rows whose class changed are touched, so a recheck of healthy
+        # links doesn't fill the change log
+        changed = [bid for bid, health in recorded if conn.execute(
+            "UPDATE bookmarks SET health = ? WHERE id = ? AND health != ?", (health, bid, health)
+        ).rowcount]
+    notify_change(changed)
+    return recorded
+
+def get_health_counts():
+    conn = get_connection()
+    return conn.execute("SELECT health, COUNT(*) FROM bookmarks GROUP BY health ORDER BY health").fetchall()
+
+def get_link_health(ids):
+    # id -> (health, status, final_url, redirects, latency_ms, error, checked_at)
+    ids = list(ids)
+    if not ids:
+        return {}
+    conn = get_connection()
+    placeholders = ", ".join("?" for _ in ids)
+    rows = conn.execute(f'''
+        SELECT b.id, b.health, h.status, h.final_url, h.redirects, h.latency_ms, h.error, h.checked_at
+        FROM bookmarks b LEFT JOIN link_health h ON h.bookmark_id = b.id WHERE b.id IN ({placeholders})
+    ''', ids).fetchall()
+    return {row[0]: row[1:] for row in rows}
+
+def store_capture(conn, bookmark_id, page, now=None):
+    # Points the bookmark at the archived copy of page.text (and page.html),
+    # storing it first unless identical content is already archived
+    import hashlib
+    import zlib
+    text = page.text[:ARCHIVE_MAX_TEXT].encode()
+    html = page.html.encode() if page.html else None
+    if html and len(html) > ARCHIVE_MAX_HTML:
+        html = None
+    digest = hashlib.blake2b(text + b"\0" + (html or b""), digest_size=16).digest()
+    row = conn.execute("SELECT id FROM page_content WHERE hash = ?", (digest,)).fetchone()
+    if row:
+        content_id = row[0]
+    else:
+        stored = zlib.compress(text, 6)
+        stored_html = zlib.compress(html, 6) if html else None
+        stored_size = len(stored) + len(stored_html or b"")
+        if _archive_size(conn) + stored_size > ARCHIVE_MAX_TOTAL:
+            # Pages no bookmark points at any more may free enough room
+            prune_archive(conn)
+            if _archive_size(conn) + stored_size > ARCHIVE_MAX_TOTAL:
+                return None
+        content_id = conn.execute(
+            "INSERT INTO page_content (hash, text, html, size, stored_size) VALUES (?, ?, ?, ?, ?)",
+            (digest, stored, stored_html, len(text) + len(html or b""), stored_size),
+        ).lastrowid
+        conn.execute("INSERT INTO page_text_fts (rowid, text) VALUES (?, ?)", (content_id, text.decode()))
+    conn.execute('''
+        INSERT INTO bookmark_pages (bookmark_id, content_id, captured_at) VALUES (?, ?, ?)
+        ON CONFLICT(bookmark_id) DO UPDATE SET content_id = excluded.content_id, captured_at = excluded.captured_at
+    ''', (bookmark_id, content_id, now or int(time.time())))
+    return content_id
+
+def _archive_size(conn):
+    return conn.execute("SELECT stored_size FROM archive_totals").fetchone()[0]
+
+def prune_archive(conn):
+    # Drops archived content no bookmark points at any more; refs = 0 matches
+    # the partial index, so only those rows are read
+    import zlib
+    for content_id, text in conn.execute("SELECT id, text FROM page_content WHERE refs = 0").fetchall():
+        conn.execute("INSERT INTO page_text_fts (page_text_fts, rowid, text) VALUES ('delete', ?, ?)", (content_id, zlib.decompress(text).decode()))
+        conn.execute("DELETE FROM page_content WHERE id = ?", (content_id,))
+
+def get_unarchived(after_id=0, limit=1000):
+    # (id, url, None, None) in id order for bookmarks without a captured page,
+    # ready to pass to refresher.refresh
+    conn = get_connection()
+    return conn.execute('''
+        SELECT id, url, NULL, NULL FROM bookmarks b
+        WHERE id > ? AND NOT EXISTS (SELECT 1 FROM bookmark_pages p WHERE p.bookmark_id = b.id)
+        ORDER BY id LIMIT ?
+    ''', (after_id, limit)).fetchall()
+
+def get_archived_page(bookmark_id):
+    # (text, html, captured_at) of the bookmark's captured page, or None
+    import zlib
+    conn = get_connection()
+    row = conn.execute('''
+        SELECT c.text, c.html, p.captured_at FROM bookmark_pages p JOIN page_content c ON c.id = p.content_id
+        WHERE p.bookmark_id = ?
+    ''', (bookmark_id,)).fetchone()
+    if row is None:
+        return None
+    text, html, captured_at = row
+    return zlib.decompress(text).decode(), zlib.decompress(html).decode() if html else None, captured_at
+
+def get_archive_stats():
+    # (bookmarks captured, distinct pages stored, raw bytes, compressed bytes)
+    conn = get_connection()
+    captured = conn.execute("SELECT COUNT(*) FROM bookmark_pages").fetchone()[0]
+    return (captured,) + conn.execute("SELECT pages, size, stored_size FROM archive_totals").fetchone()
+
+def record_visit(bookmark_id):
+    now = int(time.time())
+    with transaction() as conn:
+        conn.execute(
+            "UPDATE bookmarks SET visit_count = visit_count + 1, last_visited = ?, frecency = frecency_add(frecency, ?) WHERE id = ?",
+            (now, now, bookmark_id),
+        )
+    notify_change([bookmark_id])
+
+def update_bookmark(bookmark_id, title, color, tags):
+    with transaction() as conn:
+        conn.execute("UPDATE bookmarks SET title = ?, color = ?, tags = ?, title_status = 'done' WHERE id = ?", (title, color, tags, bookmark_id))
+        set_tags(conn, bookmark_id, tags)
+    notify_change([bookmark_id])
+
+def delete_bookmark(bookmark_id):
+    delete_bookmarks([bookmark_id])
+
+def delete_bookmarks(ids):
+    ids = list(ids)
+    with transaction() as conn:
+        conn.executemany("DELETE FROM bookmarks WHERE id = ?", [(bid,) for bid in ids])
+        prune_archive(conn)
+    notify_change(ids)
+
+def dedupe_bookmarks(dry_run=False):
+    # Merges rows whose URLs canonicalize to the same page into the oldest one:
+    # tags are combined, visits added up, and a pending title replaced by a
+    # fetched one. Returns [(kept_id, [removed ids])].
+    conn = get_connection()
+    groups = []
+    for (hash_value,) in conn.execute("SELECT url_hash FROM bookmarks GROUP BY url_hash HAVING COUNT(*) > 1").fetchall():
+        rows = conn.execute('''
+            SELECT id, url, title, folder_id, tags, title_status, created_at, last_visited, visit_count, frecency
+            FROM bookmarks WHERE url_hash = ? ORDER BY id
+        ''', (hash_value,)).fetchall()
+        by_key = {}
+        for row in rows:
+            by_key.setdefault(normalize_url(row[1]), []).append(row)
+        groups.extend(group for group in by_key.values() if len(group) > 1)
+    merged = [(group[0][0], [row[0] for row in group[1:]]) for group in groups]
+    if dry_run or not groups:
+        return merged
+    with transaction() as conn:
+        for keep, *duplicates in groups:
+            bid, url, title, folder_id, tags, title_status, created_at, last_visited, visit_count, frecency = keep
+            for row in duplicates:
+                if title_status == "pending" and row[5] == "done":
+                    title, title_status = row[2], "done"
+                folder_id = folder_id or row[3]
+                tags = ",".join(split_tags(f"{tags or ''},{row[4] or ''}"))
+                created_at = min(created_at, row[6]) if created_at and row[6] else created_at or row[6]
+                last_visited = max(last_visited, row[7])
+                visit_count += row[8]
+                frecency = frecency_add(frecency, row[9])
+            conn.executemany("DELETE FROM bookmarks WHERE id = ?", [(row[0],) for row in duplicates])
+            conn.execute('''
+                UPDATE bookmarks SET title = ?, title_status = ?, folder_id = ?, tags = ?, created_at = ?, last_visited = ?, visit_count = ?, frecency = ?
+                WHERE id = ?
+            ''', (title, title_status, folder_id, tags, created_at, last_visited, visit_count, frecency, bid))
+            set_tags(conn, bid, tags)
+        prune_archive(conn)
+    notify_change([bid for kept, removed in merged for bid in [kept] + removed])
+    return merged
 
 def reset_db():
-    if os.path.exists(DB_PATH):
-        os.remove(DB_PATH)
+    global _generation
+    close_db()
+    _generation += 1
+    for path in (DB_PATH, DB_PATH + "-wal", DB_PATH + "-shm"):
+        if os.path.exists(path):
+            os.remove(path)
     init_db()
+    migrate_db()
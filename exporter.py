@@ -0,0 +1,85 @@
+import argparse
+import csv
+import json
+import os
+import sys
+from html import escape
+
+FOLDER_SEPARATOR = " / "
+
+def write_jsonl(rows, out):
+    count = 0
+    for bid, url, title, folder, tags, created_at in rows:
+        out.write(json.dumps({"url": url, "title": title, "folder": folder, "tags": tags or "", "created_at": created_at}, ensure_ascii=False))
+        out.write("\n")
+        count += 1
+    return count
+
+def write_csv(rows, out):
+    writer = csv.writer(out)
+    writer.writerow(["url", "title", "folder", "tags", "created_at"])
+    count = 0
+    for bid, url, title, folder, tags, created_at in rows:
+        writer.writerow([url, title or "", folder or "", tags or "", created_at or ""])
+        count += 1
+    return count
+
+def write_netscape(rows, out):
+    # rows must arrive grouped by folder so each folder's <DL> is opened once
+    out.write("<!DOCTYPE NETSCAPE-Bookmark-file-1>\n")
+    out.write('<META HTTP-EQUIV="Content-Type" CONTENT="text/html; charset=UTF-8">\n')
+    out.write("<TITLE>Bookmarks</TITLE>\n<H1>Bookmarks</H1>\n<DL><p>\n")
+    path = []
+    count = 0
+    for bid, url, title, folder, tags, created_at in rows:
+        new_path = folder.split(FOLDER_SEPARATOR) if folder else []
+        common = 0
+        while common < min(len(path), len(new_path)) and path[common] == new_path[common]:
+            common += 1
+        for depth in range(len(path), common, -1):
+            out.write("    " * depth + "</DL><p>\n")
+        for depth in range(common, len(new_path)):
+            indent = "    " * (depth + 1)
+            out.write(f"{indent}<DT><H3>{escape(new_path[depth])}</H3>\n{indent}<DL><p>\n")
+        path = new_path
+        indent = "    " * (len(path) + 1)
+        add_date = f' ADD_DATE="{created_at}"' if created_at else ""
+        tag_attr = f' TAGS="{escape(tags)}"' if tags else ""
+        out.write(f'{indent}<DT><A HREF="{escape(url)}"{add_date}{tag_attr}>{escape(title or url)}</A>\n')
+        count += 1
+    for depth in range(len(path), 0, -1):
+        out.write("    " * depth + "</DL><p>\n")
+    out.write("</DL><p>\n")
+    return count
+
+WRITERS = {
+    "jsonl": write_jsonl,
+    "csv": write_csv,
+    "html": write_netscape,
+}
+
+def export_bookmarks(out, fmt="jsonl", tag=None, folder=None):
+    from db import iter_bookmarks
+    rows = iter_bookmarks(tag=tag, folder=folder, order_by_folder=(fmt == "html"))
+    return WRITERS[fmt](rows, out)
+
+def export_command(argv):
+    parser = argparse.ArgumentParser(prog="linkdb export", description="Export bookmarks")
+    parser.add_argument("--format", choices=sorted(WRITERS), default="jsonl", help="output format (default: jsonl)")
+    parser.add_argument("--tag", help="only export bookmarks with this tag")
+    parser.add_argument("--folder", help="only export bookmarks in this folder and its subfolders")
+    parser.add_argument("-o", "--output", help="file to write (default: stdout)")
+    args = parser.parse_args(argv)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8", newline="") as out:
+            count = export_bookmarks(out, args.format, args.tag, args.folder)
+    else:
+        try:
+            count = export_bookmarks(sys.stdout, args.format, args.tag, args.folder)
+            sys.stdout.flush()
+        except BrokenPipeError:
+            # The reader went away (e.g. piped into head); silence the final flush at exit
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+            return 1
+    print(f"Exported {count} bookmarks", file=sys.stderr)
+    return 0
@@ -0,0 +1,173 @@
+import argparse
+import csv
+import json
+import os
+import sys
+from html.parser import HTMLParser
+
+# Parsers yield (url, title, folder, tags, created_at) tuples one at a time so
+# large exports never have to be held in memory; folder is a " / " joined path.
+
+CHUNK_SIZE = 64 * 1024
+SKIPPED_SCHEMES = ("place:", "javascript:", "chrome:", "about:")
+FOLDER_SEPARATOR = " / "
+
+class NetscapeParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.records = []
+        self._folders = []
+        self._pending_folder = None
+        self._in_folder_name = False
+        self._link = None
+        self._text = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "h3":
+            self._in_folder_name = True
+            self._text = []
+        elif tag == "dl":
+            self._folders.append(self._pending_folder)
+            self._pending_folder = None
+        elif tag == "a":
+            self._link = dict(attrs)
+            self._text = []
+
+    def handle_endtag(self, tag):
+        if tag == "h3" and self._in_folder_name:
+            self._in_folder_name = False
+            self._pending_folder = "".join(self._text).strip() or None
+        elif tag == "dl" and self._folders:
+            self._folders.pop()
+        elif tag == "a" and self._link is not None:
+            link = self._link
+            self._link = None
+            url = (link.get("href") or "").strip()
+            if not url or url.startswith(SKIPPED_SCHEMES):
+                return
+            folder = FOLDER_SEPARATOR.join(name for name in self._folders if name) or None
+            self.records.append((url, "".join(self._text).strip() or None, folder, link.get("tags") or "", to_timestamp(link.get("add_date"))))
+
+    def handle_data(self, data):
+        if self._in_folder_name or self._link is not None:
+            self._text.append(data)
+
+def to_timestamp(value, scale=1):
+    try:
+        return int(int(value) / scale) or None
+    except (TypeError, ValueError):
+        return None
+
+def parse_netscape(f):
+    parser = NetscapeParser()
+    while True:
+        chunk = f.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        parser.feed(chunk)
+        yield from parser.records
+        parser.records = []
+    parser.close()
+    yield from parser.records
+
+def parse_chrome_json(f):
+    # Chrome's Bookmarks file is one JSON document, so it is loaded whole;
+    # use JSONL for exports too large for that
+    data = json.load(f)
+    stack = [(root, []) for root in reversed(list(data.get("roots", {}).values())) if isinstance(root, dict)]
+    while stack:
+        node, path = stack.pop()
+        if node.get("type") == "url":
+            url = node.get("url", "")
+            if url and not url.startswith(SKIPPED_SCHEMES):
+                # date_added is microseconds since 1601-01-01
+                created_at = to_timestamp(node.get("date_added"), 1000000)
+                created_at = created_at - 11644473600 if created_at else None
+                yield url, node.get("name") or None, FOLDER_SEPARATOR.join(path) or None, "", created_at
+        else:
+            child_path = path + [node["name"]] if node.get("name") else path
+            for child in reversed(node.get("children", [])):
+                stack.append((child, child_path))
+
+def parse_jsonl(f):
+    for line in f:
+        line = line.strip()
+        if not line:
+            continue
+        entry = json.loads(line)
+        url = entry.get("url")
+        if url:
+            yield url, entry.get("title") or None, entry.get("folder") or None, entry.get("tags") or "", to_timestamp(entry.get("created_at"))
+
+CSV_COLUMNS = {
+    "url": ("url", "href", "link", "address"),
+    "title": ("title", "name"),
+    "folder": ("folder", "category", "collection"),
+    "tags": ("tags", "tag", "labels"),
+    "created_at": ("created_at", "created", "add_date", "time_added", "date_added"),
+}
+
+def parse_csv(f):
+    reader = csv.reader(f)
+    header = [column.strip().lower() for column in next(reader, [])]
+    columns = {}
+    for field, names in CSV_COLUMNS.items():
+        columns[field] = next((header.index(name) for name in names if name in header), None)
+    if columns["url"] is None:
+        raise ValueError("CSV file has no url column")
+
+    def get(row, field):
+        index = columns[field]
+        return row[index].strip() if index is not None and index < len(row) else ""
+
+    for row in reader:
+        url = get(row, "url")
+        if url:
+            yield url, get(row, "title") or None, get(row, "folder") or None, get(row, "tags"), to_timestamp(get(row, "created_at"))
+
+PARSERS = {
+    "html": parse_netscape,
+    "json": parse_chrome_json,
+    "jsonl": parse_jsonl,
+    "csv": parse_csv,
+}
+
+def detect_format(path):
+    extension = os.path.splitext(path)[1].lower().lstrip(".")
+    if extension in ("htm", "html"):
+        return "html"
+    if extension in PARSERS:
+        return extension
+    with open(path, encoding="utf-8", errors="replace") as f:
+        head = f.read(512).lstrip().lower()
+    if head.startswith("<!doctype netscape") or head.startswith("<"):
+        return "html"
+    if head.startswith("{") and '"roots"' in head:
+        return "json"
+    if head.startswith("{"):
+        return "jsonl"
+    return "csv"
+
+def import_file(path, fmt=None, tags=None, batch_size=5000, progress=None):
+    from db import import_bookmarks
+    fmt = fmt or detect_format(path)
+    with open(path, encoding="utf-8", errors="replace", newline="") as f:
+        return import_bookmarks(PARSERS[fmt](f), tags=tags, batch_size=batch_size, progress=progress)
+
+def import_command(argv):
+    parser = argparse.ArgumentParser(prog="linkdb import", description="Import bookmarks from a browser export")
+    parser.add_argument("path", help="Netscape bookmark HTML, Chrome Bookmarks JSON, JSONL or CSV file")
+    parser.add_argument("--format", choices=sorted(PARSERS), help="input format (detected from the file by default)")
+    parser.add_argument("--tags", default="", help="extra tags added to every imported bookmark")
+    parser.add_argument("--batch-size", type=int, default=5000, help="bookmarks written per transaction")
+    args = parser.parse_args(argv)
+
+    def progress(added, skipped):
+        print(f"\rImported {added} bookmarks ({skipped} already saved)", end="", file=sys.stderr, flush=True)
+
+    added, skipped = import_file(args.path, args.format, args.tags, args.batch_size, progress)
+    if not added and not skipped:
+        # Progress only runs after a batch, so an empty file printed nothing
+        progress(added, skipped)
+    print(file=sys.stderr)
+    return 0
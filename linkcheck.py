@@ -0,0 +1,66 @@
+import time
+from collections import Counter
+
+import db
+
+# Link health checks: HEAD (falling back to a one-byte ranged GET) for every
+# bookmark, many hosts at once but only a couple of requests per host, with
+# results written back in batched transactions.
+
+MAX_WORKERS = 32
+PER_HOST = 2
+HOST_DELAY = 0.5
+# Links checked more recently than this are skipped
+CHECK_AGE = 7 * 86400
+# Bookmarks read per query; each batch is interleaved by host before fetching
+BATCH_SIZE = 5000
+WRITE_BATCH = 200
+WRITE_INTERVAL = 1.0
+
+def check(items, on_results=None, max_workers=MAX_WORKERS, per_host=PER_HOST, host_delay=HOST_DELAY, should_stop=None):
+    # items: (id, url). Returns a Counter of health classes; on_results is
+    # called with the (id, health) pairs of each write.
+    from utils import iter_links
+    counts = Counter()
+    batch = []
+    last_write = time.monotonic()
+
+    def flush():
+        recorded = db.record_link_health(batch)
+        batch.clear()
+        counts.update(health for _, health in recorded)
+        if on_results:
+            on_results(recorded)
+
+    links = iter_links(items, max_workers, per_host, host_delay)
+    try:
+        for bid, link in links:
+            batch.append((bid, link))
+            if len(batch) >= WRITE_BATCH or time.monotonic() - last_write >= WRITE_INTERVAL:
+                flush()
+                last_write = time.monotonic()
+            if should_stop and should_stop():
+                break
+    finally:
+        links.close()
+        if batch:
+            flush()
+    return counts
+
+def check_all(max_age=CHECK_AGE, limit=None, should_stop=None, **kwargs):
+    # Walks the whole table in id order, checking links not checked within max_age
+    counts = Counter()
+    after_id = 0
+    checked = 0
+    checked_before = int(time.time() - max_age)
+    while limit is None or checked < limit:
+        size = BATCH_SIZE if limit is None else min(BATCH_SIZE, limit - checked)
+        items = db.get_links_to_check(after_id, checked_before, size)
+        if not items:
+            break
+        after_id = items[-1][0]
+        counts += check(items, should_stop=should_stop, **kwargs)
+        checked += len(items)
+        if should_stop and should_stop():
+            break
+    return counts
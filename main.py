@@ -1,7 +1,57 @@
-from db import init_db
-from ui import BookmarkApp
+import os
+import sys
+import db
 
 if __name__ == "__main__":
-    init_db()
-    app = BookmarkApp()
-    app.run()
+    # --db PATH or LINKDB_DB picks the database file (default: ./bookmarks.db)
+    path = os.environ.get("LINKDB_DB")
+    for index, arg in enumerate(sys.argv[1:], start=1):
+        if arg == "--db" and index + 1 < len(sys.argv):
+            path = sys.argv[index + 1]
+            del sys.argv[index:index + 2]
+            break
+        if arg.startswith("--db="):
+            path = arg.partition("=")[2]
+            del sys.argv[index]
+            break
+    if path:
+        db.DB_PATH = os.path.expanduser(path)
+    # --archive[=html] or LINKDB_ARCHIVE=text|html keeps the text (and markup)
+    # of fetched pages for offline reading and full-text search
+    archive = os.environ.get("LINKDB_ARCHIVE")
+    for arg in sys.argv[1:]:
+        if arg == "--archive" or arg.startswith("--archive="):
+            sys.argv.remove(arg)
+            archive = arg.partition("=")[2] or "text"
+            break
+    if archive and archive != "0":
+        db.ARCHIVE = "html" if archive == "html" else "text"
+    # --profile[=PATH] or LINKDB_PROFILE=1|PATH turns on instrumentation;
+    # a PATH ending in .pstats/.prof gets cProfile data, others JSON stats
+    profile = os.environ.get("LINKDB_PROFILE")
+    for arg in sys.argv[1:]:
+        if arg == "--profile" or arg.startswith("--profile="):
+            sys.argv.remove(arg)
+            profile = arg.partition("=")[2] or "1"
+            break
+    if profile:
+        import profiling
+        profiling.enable(cprofile=profile.endswith((".pstats", ".prof")))
+    interactive = len(sys.argv) == 1
+    # Called through the module so profiling's wrappers see startup too
+    db.init_db()
+    db.migrate_db()
+    try:
+        if not interactive:
+            # Headless commands never import Textual
+            from cli import main
+            sys.exit(main(sys.argv[1:]))
+        from ui import BookmarkApp
+        if profile:
+            profiling.instrument_app(BookmarkApp)
+        app = BookmarkApp()
+        app.run()
+    finally:
+        db.close_db()
+        if profile:
+            profiling.finish(profile, interactive)
@@ -0,0 +1,171 @@
+import inspect
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+# Opt-in instrumentation, switched on with --profile or LINKDB_PROFILE. When it
+# is off nothing here is installed and the rest of the app pays no cost.
+
+ENABLED = False
+SKIPPED_DB_FUNCTIONS = ("transaction", "contextmanager")
+
+_timings = {}
+_queries = {}
+_lock = threading.Lock()
+_local = threading.local()
+_profiler = None
+
+def enable(cprofile=False):
+    global ENABLED, _profiler
+    if ENABLED:
+        return
+    ENABLED = True
+    instrument_db()
+    if cprofile:
+        import cProfile
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+
+def record(name, seconds=0.0, **amounts):
+    ms = seconds * 1000
+    with _lock:
+        entry = _timings.setdefault(name, {"calls": 0, "total_ms": 0.0, "max_ms": 0.0})
+        entry["calls"] += 1
+        entry["total_ms"] += ms
+        entry["max_ms"] = max(entry["max_ms"], ms)
+        for key, value in amounts.items():
+            entry[key] = entry.get(key, 0) + value
+
+def timed(name, fn):
+    if inspect.iscoroutinefunction(fn):
+        @wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - start)
+        return async_wrapper
+    if inspect.isgeneratorfunction(fn):
+        @wraps(fn)
+        def generator_wrapper(*args, **kwargs):
+            # Time the whole iteration, not just creating the generator
+            start = time.perf_counter()
+            try:
+                yield from fn(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - start)
+        return generator_wrapper
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            record(name, time.perf_counter() - start)
+    return wrapper
+
+def count_query(statement):
+    if statement.startswith("--"):
+        # Nested statements run by triggers and FTS5 internals
+        return
+    action = getattr(_local, "action", None)
+    if action is None:
+        action = "startup" if threading.current_thread() is threading.main_thread() else "background"
+    with _lock:
+        _queries[action] = _queries.get(action, 0) + 1
+
+def instrument_db():
+    import db
+    for name, value in list(vars(db).items()):
+        if inspect.isfunction(value) and value.__module__ == "db" and name not in SKIPPED_DB_FUNCTIONS:
+            setattr(db, name, timed(f"db.{name}", value))
+    db.CONNECT_HOOKS.append(lambda conn: conn.set_trace_callback(count_query))
+    if db._conn is not None:
+        db._conn.set_trace_callback(count_query)
+
+def instrument_network():
+    # Split fetch time into DNS and TCP connect; called once requests is loaded
+    import socket
+    from urllib3.util import connection
+    connection.create_connection = timed("fetch.connect", connection.create_connection)
+    socket.getaddrinfo = timed("fetch.dns", socket.getaddrinfo)
+
+@contextmanager
+def action(name):
+    previous = getattr(_local, "action", None)
+    _local.action = name
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _local.action = previous
+        record(f"ui.{name}", time.perf_counter() - start)
+
+def instrument_app(cls):
+    # Wrap screen builders and user actions so their time and the queries they
+    # issue are attributed to them
+    for name, value in list(vars(cls).items()):
+        if not inspect.isfunction(value):
+            continue
+        if not (name.startswith("show_") or name.startswith("action_") or name in ("on_button_pressed", "on_key", "on_input_changed", "on_list_view_item_selected")):
+            continue
+        setattr(cls, name, _ui_wrapper(name, value))
+    return cls
+
+def _ui_wrapper(name, fn):
+    if inspect.iscoroutinefunction(fn):
+        @wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            with action(name):
+                return await fn(*args, **kwargs)
+        return async_wrapper
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        with action(name):
+            return fn(*args, **kwargs)
+    return wrapper
+
+def snapshot():
+    with _lock:
+        timings = {name: dict(entry, total_ms=round(entry["total_ms"], 3), max_ms=round(entry["max_ms"], 3)) for name, entry in _timings.items()}
+        return {"timings": timings, "queries": dict(_queries)}
+
+def reset():
+    with _lock:
+        _timings.clear()
+        _queries.clear()
+
+def summary_lines(limit=40):
+    data = snapshot()
+    lines = [f"{'name':<40} {'calls':>7} {'total ms':>11} {'max ms':>9}"]
+    for name, entry in sorted(data["timings"].items(), key=lambda item: -item[1]["total_ms"])[:limit]:
+        extra = f"  {entry['bytes']} bytes" if "bytes" in entry else ""
+        lines.append(f"{name:<40} {entry['calls']:>7} {entry['total_ms']:>11.1f} {entry['max_ms']:>9.1f}{extra}")
+    if data["queries"]:
+        lines.append("")
+        lines.append("SQL statements per action")
+        for name, count in sorted(data["queries"].items(), key=lambda item: -item[1]):
+            lines.append(f"{name:<40} {count:>7}")
+    return lines
+
+def dump(path):
+    # .pstats/.prof paths get the cProfile data, anything else the JSON stats
+    if path.endswith((".pstats", ".prof")) and _profiler is not None:
+        _profiler.disable()
+        _profiler.dump_stats(path)
+        return
+    with open(path, "w") as f:
+        json.dump(snapshot(), f, indent=2)
+
+def finish(target, interactive):
+    if target in ("1", "true", "yes"):
+        if not interactive:
+            print("\n".join(summary_lines()), file=sys.stderr)
+    else:
+        dump(target)
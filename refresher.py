@@ -0,0 +1,54 @@
+import time
+
+import db
+
+# Background title refresh. Bookmarks come due through page_meta.next_fetch:
+# new pending rows at once, failed fetches after a growing negative-cache TTL,
+# and everything else after db.REFRESH_TTL, re-checked with If-None-Match /
+# If-Modified-Since so unchanged pages cost a 304 and no body. With db.ARCHIVE
+# set, the same fetches capture page text for the archive.
+
+BATCH_SIZE = 200
+MAX_WORKERS = 8
+PER_HOST = 2
+# Minimum gap between requests to the same host, in seconds
+HOST_DELAY = 1.0
+# Results are written back in one transaction per this many pages, or sooner
+# once WRITE_INTERVAL seconds have passed since the last write
+WRITE_BATCH = 50
+WRITE_INTERVAL = 1.0
+
+def refresh(items, on_titles=None, max_workers=MAX_WORKERS, per_host=PER_HOST, host_delay=HOST_DELAY, should_stop=None):
+    # items: (id, url, etag, last_modified). Returns the number of pages
+    # fetched; on_titles is called with the (id, title) pairs each write
+    # changed.
+    from utils import iter_pages
+    done = 0
+    batch = []
+    last_write = time.monotonic()
+
+    def flush():
+        changed = db.record_pages(batch)
+        batch.clear()
+        if changed and on_titles:
+            on_titles(changed)
+
+    pages = iter_pages(items, max_workers, per_host, host_delay, capture=db.ARCHIVE)
+    try:
+        for bid, page in pages:
+            batch.append((bid, page))
+            done += 1
+            if len(batch) >= WRITE_BATCH or time.monotonic() - last_write >= WRITE_INTERVAL:
+                flush()
+                last_write = time.monotonic()
+            if should_stop and should_stop():
+                break
+    finally:
+        pages.close()
+        if batch:
+            flush()
+    return done
+
+def refresh_due(limit=BATCH_SIZE, **kwargs):
+    items = db.get_due_pages(limit)
+    return refresh(items, **kwargs) if items else 0
@@ -0,0 +1,290 @@
+import bisect
+import heapq
+import sys
+import threading
+from array import array
+
+import db
+
+# In-memory copy of the bookmarks table for the TUI, loaded on first use.
+# Writes made through db.py are applied as they commit (db.CHANGE_HOOKS);
+# writes from another process bump SQLite's data_version, and the rows they
+# touched are then read back from the bookmark_changes log by refresh(). Only
+# the TUI's database watcher calls that, so it sees every id that changed;
+# reads use the model as it is. Full reloads (first use, or after more than
+# RELOAD_THRESHOLD rows changed at once) build a new model without holding the
+# lock and swap it in, so reads keep using the old one meanwhile. Sorted pages
+# still come from the keyset queries in db.py, which only touch one page of an
+# index.
+#
+# Quick-open also keeps the QUICK_OPEN_HEAD most frecent bookmarks in a sorted
+# list with their search tokens, so a keystroke scans at most that many rows;
+# only queries with too few matches among them go on to SQLite.
+
+RELOAD_THRESHOLD = 1000
+QUICK_OPEN_HEAD = 5000
+COLUMNS = "id, url, title, folder_id, color, tags, frecency, url_hash"
+
+class Model:
+    # Columns indexed by slot, with slots looked up by id. Colors, tag strings
+    # and tag names repeat across many rows and are interned; numbers live in
+    # arrays rather than as objects. Slots of deleted rows are reused.
+    __slots__ = ("slots", "free", "ids", "urls", "titles", "folder_ids", "colors", "tags", "frecency",
+                 "by_url", "by_tag", "tag_names", "head", "head_tokens", "head_limit")
+
+    def __init__(self):
+        self.slots = {}
+        self.free = []
+        self.ids = array("q")
+        self.urls = []
+        self.titles = []
+        # 0 for bookmarks outside any folder
+        self.folder_ids = array("q")
+        self.colors = []
+        self.tags = []
+        self.frecency = array("d")
+        self.by_url = {}
+        # Sorted ids per tag name
+        self.by_tag = {}
+        self.tag_names = {}
+        # Sorted head keys; every bookmark whose key is <= head_limit is in it
+        self.head = []
+        self.head_tokens = {}
+        self.head_limit = None
+
+    def row(self, bid):
+        slot = self.slots.get(bid)
+        if slot is None:
+            return None
+        return (bid, self.urls[slot], self.titles[slot], self.folder_ids[slot] or None, self.colors[slot], self.tags[slot])
+
+    def head_key(self, slot):
+        # Most frecent first, then newest, matching the frecency_desc sort
+        return (-self.frecency[slot], -self.ids[slot])
+
+    def split_tags(self, tags):
+        names = self.tag_names.get(tags)
+        if names is None:
+            names = self.tag_names[tags] = tuple(sys.intern(name) for name in db.split_tags(tags))
+        return names
+
+    def add(self, row, head=True):
+        bid, url, title, folder_id, color, tags, frecency, url_hash = row
+        color = sys.intern(color) if color else color
+        tags = sys.intern(tags) if tags else tags
+        if self.free:
+            slot = self.free.pop()
+            self.ids[slot] = bid
+            self.urls[slot] = url
+            self.titles[slot] = title
+            self.folder_ids[slot] = folder_id or 0
+            self.colors[slot] = color
+            self.tags[slot] = tags
+            self.frecency[slot] = frecency or 0.0
+        else:
+            slot = len(self.ids)
+            self.ids.append(bid)
+            self.urls.append(url)
+            self.titles.append(title)
+            self.folder_ids.append(folder_id or 0)
+            self.colors.append(color)
+            self.tags.append(tags)
+            self.frecency.append(frecency or 0.0)
+        self.slots[bid] = slot
+        # Duplicates not yet merged by dedupe keep the oldest row in the index
+        if self.by_url.get(url_hash, bid) >= bid:
+            self.by_url[url_hash] = bid
+        for name in self.split_tags(tags):
+            ids = self.by_tag.get(name)
+            if ids is None:
+                self.by_tag[name] = array("q", (bid,))
+            elif ids[-1] < bid:
+                # Loads read rows in id order
+                ids.append(bid)
+            else:
+                bisect.insort(ids, bid)
+        if head:
+            self.head_add(slot)
+
+    def remove(self, bid):
+        slot = self.slots.pop(bid)
+        if bid in self.head_tokens:
+            del self.head[bisect.bisect_left(self.head, self.head_key(slot))]
+            del self.head_tokens[bid]
+        url_hash = db.url_hash(self.urls[slot])
+        if self.by_url.get(url_hash) == bid:
+            del self.by_url[url_hash]
+        for name in self.split_tags(self.tags[slot]):
+            ids = self.by_tag.get(name)
+            if ids is not None:
+                index = bisect.bisect_left(ids, bid)
+                if index < len(ids) and ids[index] == bid:
+                    del ids[index]
+                if not ids:
+                    del self.by_tag[name]
+        self.urls[slot] = self.titles[slot] = self.colors[slot] = self.tags[slot] = None
+        self.free.append(slot)
+
+    def head_add(self, slot):
+        key = self.head_key(slot)
+        if self.head_limit is not None and key > self.head_limit:
+            return
+        bisect.insort(self.head, key)
+        text = f"{self.titles[slot] or ''} {self.urls[slot]} {self.tags[slot] or ''}"
+        self.head_tokens[self.ids[slot]] = tuple(sys.intern(token) for token in db.TOKEN_RE.findall(db.fold_text(text)))
+        if len(self.head) > QUICK_OPEN_HEAD:
+            _, dropped = self.head.pop()
+            del self.head_tokens[-dropped]
+            self.head_limit = self.head[-1]
+
+    def build_head(self):
+        self.head = []
+        self.head_tokens = {}
+        self.head_limit = None
+        for slot in heapq.nsmallest(QUICK_OPEN_HEAD, self.slots.values(), key=self.head_key):
+            self.head_add(slot)
+        if len(self.head) >= QUICK_OPEN_HEAD:
+            self.head_limit = self.head[-1]
+
+_lock = threading.RLock()
+# Serializes full loads; never taken while holding _lock
+_load_lock = threading.RLock()
+_model = None
+_conn = None
+_data_version = None
+_seq = 0
+# Set when a local write changed too much to apply; the next refresh() reloads
+_stale = False
+# Ids of commits that landed while a load was scanning, for refresh() to report
+_pending = set()
+
+def load():
+    global _model, _conn, _data_version, _seq, _stale
+    with _load_lock:
+        conn = db.get_connection()
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        seq = db.get_change_seq()
+        model = Model()
+        for row in conn.execute(f"SELECT {COLUMNS} FROM bookmarks ORDER BY id"):
+            model.add(row, head=False)
+        model.build_head()
+        with _lock:
+            _model, _conn, _data_version, _stale = model, conn, data_version, False
+            # Catch up with whatever committed during the scan
+            _seq, ids = db.get_changes(seq, RELOAD_THRESHOLD)
+            if ids is None:
+                _stale = True
+            else:
+                _apply(conn, ids)
+                _pending.update(ids)
+
+def ensure_loaded():
+    if _model is None or _conn is not db.get_connection():
+        with _load_lock:
+            if _model is None or _conn is not db.get_connection():
+                load()
+
+def invalidate():
+    global _stale
+    with _lock:
+        _stale = True
+
+def _apply(conn, ids):
+    placeholders = ", ".join("?" for _ in ids)
+    rows = conn.execute(f"SELECT {COLUMNS} FROM bookmarks WHERE id IN ({placeholders})", list(ids)).fetchall() if ids else []
+    for bid in ids:
+        if bid in _model.slots:
+            _model.remove(bid)
+    for row in rows:
+        _model.add(row)
+    if _model.head_limit is not None and len(_model.head) < QUICK_OPEN_HEAD // 2:
+        # Deletes have thinned the head out; refill it from the full model
+        _model.build_head()
+
+def refresh():
+    # Picks up commits from other processes and reloads a stale model. Returns
+    # the changed ids, or None when the whole model was reloaded (the caller
+    # should redraw everything). Reloads run on the calling thread; the TUI
+    # only calls this from its watcher worker.
+    global _data_version, _seq
+    first = _model is None
+    if not first:
+        with _lock:
+            conn = db.get_connection()
+            if not _stale and conn is _conn:
+                ids = []
+                data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+                if data_version != _data_version:
+                    _data_version = data_version
+                    _seq, ids = db.get_changes(_seq, RELOAD_THRESHOLD)
+                if ids is not None:
+                    _apply(conn, ids)
+                    ids = sorted(_pending.union(ids))
+                    _pending.clear()
+                    return ids
+    if first:
+        ensure_loaded()
+    else:
+        load()
+    with _lock:
+        ids = sorted(_pending)
+        _pending.clear()
+    return ids if first else None
+
+def on_change(ids):
+    with _lock:
+        if _model is None or _stale:
+            return
+        conn = db.get_connection()
+        if ids is None or len(ids) > RELOAD_THRESHOLD or conn is not _conn:
+            invalidate()
+            return
+        _apply(conn, ids)
+
+db.CHANGE_HOOKS.append(on_change)
+
+def get_bookmark(bookmark_id):
+    ensure_loaded()
+    with _lock:
+        return _model.row(bookmark_id)
+
+def get_bookmarks(ids):
+    ensure_loaded()
+    with _lock:
+        return [_model.row(bid) for bid in sorted(ids) if bid in _model.slots]
+
+def find_bookmark(url):
+    ensure_loaded()
+    with _lock:
+        bid = _model.by_url.get(db.url_hash(url))
+        if bid is not None and db.normalize_url(_model.urls[_model.slots[bid]]) == db.normalize_url(url):
+            return bid
+        return None
+
+def get_tag_counts():
+    ensure_loaded()
+    with _lock:
+        return sorted((name, len(ids)) for name, ids in _model.by_tag.items())
+
+def quick_open(query, limit=10):
+    # The limit most frecent bookmarks with a title, url or tag token starting
+    # with every word of query
+    ensure_loaded()
+    with _lock:
+        model = _model
+        words = db.TOKEN_RE.findall(db.fold_text(query))
+        rows = []
+        for key in model.head:
+            bid = -key[1]
+            tokens = model.head_tokens[bid]
+            if all(any(token.startswith(word) for token in tokens) for word in words):
+                rows.append(model.row(bid))
+                if len(rows) >= limit:
+                    return rows
+        if model.head_limit is None:
+            # The head holds every bookmark
+            return rows
+    # The head has every match down to its limit, so the rest are the most
+    # frecent matches SQLite finds outside it
+    seen = {row[0] for row in rows}
+    return rows + [row for row in db.quick_open(query, limit + len(rows)) if row[0] not in seen][:limit - len(rows)]
@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+
+@pytest.fixture
+def database(tmp_path):
+    db.close_db()
+    db.DB_PATH = str(tmp_path / "bookmarks.db")
+    db.init_db()
+    db.migrate_db()
+    yield db.DB_PATH
+    db.close_db()
@@ -0,0 +1,96 @@
+import sqlite3
+
+import pytest
+
+import db
+
+BASELINE_SCHEMA = """
+    CREATE TABLE folders (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL UNIQUE);
+    CREATE TABLE bookmarks (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        url TEXT NOT NULL,
+        title TEXT,
+        folder_id INTEGER,
+        color TEXT,
+        tags TEXT,
+        FOREIGN KEY(folder_id) REFERENCES folders(id)
+    );
+"""
+
+@pytest.fixture
+def old_database(tmp_path):
+    # A bookmarks.db as written before schema versioning, duplicates included
+    path = str(tmp_path / "bookmarks.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE_SCHEMA)
+    conn.executemany("INSERT INTO bookmarks (url, title, color, tags) VALUES (?, ?, 'red', ?)", [
+        ("https://example.com/page", "Page", "a"),
+        ("http://www.example.com/page/?utm_source=feed", "Page again", "b"),
+        ("http://[abc", "Broken", "c"),
+        ("https://other.example/", "Other", "d"),
+    ])
+    conn.commit()
+    conn.close()
+    db.close_db()
+    db.DB_PATH = path
+    yield path
+    db.close_db()
+
+@pytest.mark.parametrize("url", [
+    "https://example.com/page",
+    "http://example.com/page",
+    "https://www.example.com/page/",
+    "https://EXAMPLE.com:443/page",
+    "example.com/page",
+    "https://example.com/page?utm_source=x&fbclid=y",
+    "https://example.com/page#section",
+])
+def test_normalize_url_same_page(url):
+    assert db.normalize_url(url) == "https://example.com/page"
+
+def test_normalize_url_keeps_differences():
+    assert db.normalize_url("https://example.com/page?b=2&a=1") == db.normalize_url("https://example.com/page?a=1&b=2")
+    assert db.normalize_url("https://example.com/page?a=1") != db.normalize_url("https://example.com/page?a=2")
+    assert db.normalize_url("https://example.com/#!/route") != db.normalize_url("https://example.com/")
+    assert db.normalize_url("https://example.com/a") != db.normalize_url("https://example.org/a")
+
+def test_normalize_url_malformed():
+    assert db.normalize_url(" http://[ABC ") == "http://[abc"
+    assert db.url_hash("http://[abc") == db.url_hash("HTTP://[abc")
+
+def test_migrate_pre_series_database(old_database):
+    db.init_db()
+    db.migrate_db()
+    conn = db.get_connection()
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == len(db.MIGRATIONS)
+    assert [row[0] for row in db.search_bookmarks("broken")] == [3]
+    assert db.get_bookmarks([1, 2, 3, 4])[2][1] == "http://[abc"
+    # Saving the malformed URL again merges into the existing row
+    assert db.add_bookmarks(["http://[abc"], tags="e", fetch=False) == []
+
+def test_dedupe_bookmarks(old_database):
+    db.init_db()
+    db.migrate_db()
+    assert db.dedupe_bookmarks(dry_run=True) == [(1, [2])]
+    assert len(db.get_bookmarks([1, 2, 3, 4])) == 4
+    assert db.dedupe_bookmarks() == [(1, [2])]
+    rows = {row[0]: row for row in db.get_bookmarks([1, 2, 3, 4])}
+    assert sorted(rows) == [1, 3, 4]
+    assert rows[1][5] == "a,b"
+    assert db.dedupe_bookmarks() == []
+
+def test_search_typed_letter_by_letter_finds_page_text(database):
+    import utils
+    title_match = db.add_bookmark("https://quokka.example/", title="Quokka facts")
+    text_match = db.add_bookmark("https://animals.example/", title="Animals")
+    with db.transaction() as conn:
+        db.store_capture(conn, text_match, utils.Page("Animals", 200, None, None, None, None, "All about the quokka"))
+    for end in range(len("quokka") + 1):
+        query = "quokka"[:end]
+        rows = db.search_from_cache(query)
+        if rows is None:
+            rows = db.search_bookmarks_cached(query)
+    assert [row[0] for row in rows] == [title_match, text_match]
+    # Results without page text hits are still narrowed in memory
+    assert [row[0] for row in db.search_bookmarks_cached("anim")] == [text_match]
+    assert [row[0] for row in db.search_from_cache("animals")] == [text_match]
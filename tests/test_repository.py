@@ -0,0 +1,33 @@
+import os
+import subprocess
+import sys
+
+import db
+import repository
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def run_elsewhere(path, code):
+    # Another process writing to the same database file
+    subprocess.run([sys.executable, "-c", f"import db; db.DB_PATH = {path!r}; {code}"], cwd=ROOT, check=True)
+
+def test_reads_leave_external_changes_to_the_watcher(database):
+    kept = db.add_bookmark("https://kept.example/", title="Kept", tags="a")
+    removed = db.add_bookmark("https://removed.example/", title="Removed", tags="b")
+    repository.load()
+    assert repository.refresh() == []
+
+    run_elsewhere(database, f"db.delete_bookmark({removed}); db.add_bookmark('https://added.example/', title='Added', tags='c')")
+    added = removed + 1
+
+    # Every getter reads the model as it was
+    assert repository.get_bookmark(removed) is not None
+    assert repository.get_bookmarks([kept, removed, added]) == [repository.get_bookmark(kept), repository.get_bookmark(removed)]
+    assert repository.find_bookmark("https://added.example/") is None
+    assert ("b", 1) in repository.get_tag_counts()
+    repository.quick_open("kept")
+
+    assert sorted(repository.refresh()) == [removed, added]
+    assert repository.get_bookmark(removed) is None
+    assert repository.find_bookmark("https://added.example/") == added
+    assert repository.refresh() == []
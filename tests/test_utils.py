@@ -0,0 +1,41 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import utils
+
+class HeadDropsHandler(BaseHTTPRequestHandler):
+    # Hangs up on HEAD without answering; GET works
+    protocol_version = "HTTP/1.1"
+    requests = []
+
+    def do_HEAD(self):
+        self.requests.append(("HEAD", self.headers.get("Range")))
+        self.close_connection = True
+
+    def do_GET(self):
+        self.requests.append(("GET", self.headers.get("Range")))
+        self.send_response(200)
+        self.send_header("Content-Length", "1")
+        self.end_headers()
+        self.wfile.write(b"x")
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), HeadDropsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    HeadDropsHandler.requests = []
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+def test_check_link_falls_back_to_get_when_head_fails(server):
+    link = utils.check_link(f"{server}/page")
+    assert HeadDropsHandler.requests == [("HEAD", None), ("GET", "bytes=0-0")]
+    assert link.status == 200
+    assert link.error is None
+    assert link.final_url == f"{server}/page"
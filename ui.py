@@ -1,15 +1,210 @@
 from textual.app import App, ComposeResult
-from textual.widgets import Header, Footer, Static, Button, Input, Label, ListView, ListItem, Select
+from textual.widgets import Header, Footer, Static, Button, Input, Label, ListView, ListItem, Select, Tree
 from textual.containers import Container, Horizontal
-from db import get_folders_and_bookmarks, add_bookmark
-from utils import fetch_title
-from textual import events
+from db import get_bookmarks_page, get_folder_bookmarks, get_folder_children, get_health_counts, get_link_health, add_bookmarks, record_visit, split_tags, HEALTH_NAMES, SORT_KEYS, SORT_ORDERS
+from repository import get_bookmark, get_bookmarks, get_tag_counts
+from textual import events, work
+from textual.command import CommandPalette, DiscoveryHit, Hit, Provider
+from textual.worker import get_current_worker
 from textual.reactive import reactive
+import asyncio
 import random
+import threading
+from functools import partial
 import webbrowser
 
+def bookmark_label(bookmark):
+    bid, url, title, folder_id, color, tags = bookmark
+    return f"[ID:{bid}] [{color}]{title or ''}[/{color}]"
+
+class BookmarkItem(ListItem):
+    def __init__(self, bookmark):
+        bid = bookmark[0]
+        super().__init__(Label(bookmark_label(bookmark), id=f"bookmark_{bid}"), id=f"bookmark_item_{bid}")
+        self._set_fields(bookmark)
+
+    def _set_fields(self, bookmark):
+        self.bookmark = bookmark
+        self.url = bookmark[1]
+        self.color = bookmark[4]
+        self.tags = bookmark[5]
+
+    def update_bookmark(self, bookmark):
+        self._set_fields(bookmark)
+        self.query_one(Label).update(bookmark_label(bookmark))
+
+class BookmarkList(ListView):
+    # Keeps only a window of pages mounted and pulls neighbouring pages from
+    # the database (keyset paging) as the cursor reaches either end.
+    PAGE_SIZE = 100
+    MAX_ITEMS = 300
+
+    def __init__(self, rows, sort, tag=None, health=None, **kwargs):
+        self.sort = sort
+        self.tag = tag
+        self.health = health
+        self._more_after = len(rows) > self.PAGE_SIZE
+        self._more_before = False
+        super().__init__(*[BookmarkItem(row) for row in rows[:self.PAGE_SIZE]], **kwargs)
+
+    def _fetch_page(self, after_id=None, before_id=None):
+        return get_bookmarks_page(self.sort, after_id=after_id, before_id=before_id, limit=self.PAGE_SIZE + 1, tag=self.tag, health=self.health)
+
+    async def action_cursor_down(self) -> None:
+        if self._more_after and self.index is not None and self.index >= len(self) - 1:
+            await self._load_after()
+        super().action_cursor_down()
+
+    async def action_cursor_up(self) -> None:
+        if self._more_before and self.index == 0:
+            await self._load_before()
+        super().action_cursor_up()
+
+    async def _load_after(self):
+        rows = self._fetch_page(after_id=self.children[-1].bookmark[0])
+        self._more_after = len(rows) > self.PAGE_SIZE
+        rows = rows[:self.PAGE_SIZE]
+        if rows:
+            await self.extend([BookmarkItem(row) for row in rows])
+        excess = len(self) - self.MAX_ITEMS
+        if excess > 0:
+            await self.remove_items(range(excess))
+            self._more_before = True
+
+    async def _load_before(self):
+        rows = self._fetch_page(before_id=self.children[0].bookmark[0])
+        self._more_before = len(rows) > self.PAGE_SIZE
+        rows = rows[-self.PAGE_SIZE:]
+        if rows:
+            await self.insert(0, [BookmarkItem(row) for row in rows])
+            self.index += len(rows)
+        excess = len(self) - self.MAX_ITEMS
+        if excess > 0:
+            await self.remove_items(range(self.MAX_ITEMS, len(self)))
+            self._more_after = True
+
+    def _neighbour(self, bid, after=False):
+        rows = get_bookmarks_page(self.sort, after_id=bid if after else None, before_id=None if after else bid, limit=1, tag=self.tag, health=self.health)
+        return rows[0][0] if rows else None
+
+    def _position(self, bid):
+        # Where a row belongs among the other loaded rows, found from its neighbour
+        # in the sort index; None if it sorts into a page that is not loaded
+        ids = [item.bookmark[0] for item in self.children if item.bookmark[0] != bid]
+        previous = self._neighbour(bid)
+        if previous is None:
+            return None if self._more_before else 0
+        if previous in ids:
+            return ids.index(previous) + 1
+        if ids and self._neighbour(bid, after=True) == ids[0]:
+            return 0
+        return None
+
+    async def remove_bookmarks(self, ids):
+        ids = set(ids)
+        indices = [index for index, item in enumerate(self.children) if item.bookmark[0] in ids]
+        if indices:
+            await self.remove_items(indices)
+
+    async def upsert(self, rows):
+        for row in rows:
+            bid = row[0]
+            current = next((item for item in self.children if item.bookmark[0] == bid), None)
+            highlighted = current is not None and current is self.highlighted_child
+            if self.tag and self.tag not in split_tags(row[5]):
+                await self.remove_bookmarks([bid])
+                continue
+            if self.health is not None and get_link_health([bid])[bid][0] != self.health:
+                await self.remove_bookmarks([bid])
+                continue
+            index = self._position(bid)
+            if current is not None:
+                if index == self.children.index(current):
+                    # Still in the same slot: just relabel
+                    current.update_bookmark(row)
+                    continue
+                await self.remove_bookmarks([bid])
+            if index is None:
+                continue
+            await self.insert(index, [BookmarkItem(row)])
+            if highlighted or self.index is None:
+                self.index = index
+            elif index <= self.index:
+                self.index += 1
+
+    async def resort(self, sort):
+        self.sort = sort
+        if self._more_before or self._more_after or sort not in SORT_KEYS:
+            # Only part of the list is loaded (or the order depends on columns the
+            # rows don't carry), so the new first page has to come from the database
+            rows = self._fetch_page()
+            self._more_after = len(rows) > self.PAGE_SIZE
+            self._more_before = False
+            rows = rows[:self.PAGE_SIZE]
+        else:
+            rows = sorted((item.bookmark for item in self.children), key=SORT_KEYS[sort], reverse=SORT_ORDERS[sort][1])
+        await self.clear()
+        await self.extend([BookmarkItem(row) for row in rows])
+        self.index = 0
+
+class FolderTree(Tree):
+    # Only the top level is read up front; each folder's subfolders and
+    # bookmarks are read when it is first expanded
+    PAGE_SIZE = 200
+
+    def __init__(self, folders, **kwargs):
+        super().__init__("Folders", **kwargs)
+        self.show_root = False
+        self._add_folders(self.root, folders)
+
+    def _add_folders(self, node, folders):
+        for fid, label, count, has_children in folders:
+            node.add(f"📁 {label} ({count})", data=("folder", fid), allow_expand=has_children or count > 0)
+
+    def _add_bookmarks(self, node, folder_id, after_id=None):
+        rows = get_folder_bookmarks(folder_id, after_id, self.PAGE_SIZE + 1)
+        for row in rows[:self.PAGE_SIZE]:
+            node.add_leaf(bookmark_label(row), data=("bookmark", row))
+        if len(rows) > self.PAGE_SIZE:
+            node.add_leaf("… more", data=("more", folder_id, rows[self.PAGE_SIZE - 1][0]))
+
+    def on_tree_node_expanded(self, event):
+        node = event.node
+        if node.data and node.data[0] == "folder" and not node.children:
+            self._add_folders(node, get_folder_children(node.data[1]))
+            self._add_bookmarks(node, node.data[1])
+
+    def on_tree_node_selected(self, event):
+        node = event.node
+        if node.data and node.data[0] == "more":
+            _, folder_id, after_id = node.data
+            parent = node.parent
+            node.remove()
+            self._add_bookmarks(parent, folder_id, after_id)
+
+class BookmarkCommands(Provider):
+    # Quick-open: bookmarks matching what has been typed, most frecent first
+    LIMIT = 20
+
+    async def _rows(self, query):
+        from repository import quick_open
+        # The first call may have to load the repository; keep the UI responsive
+        return await asyncio.to_thread(quick_open, query, self.LIMIT)
+
+    async def discover(self):
+        for row in await self._rows(""):
+            yield DiscoveryHit(row[2] or row[1], partial(self.app._open_bookmark, row), help=row[1])
+
+    async def search(self, query):
+        matcher = self.matcher(query)
+        rows = await self._rows(query)
+        for rank, row in enumerate(rows):
+            # Scores only need to keep the frecency order
+            yield Hit(1 - rank / (len(rows) + 1), matcher.highlight(row[2] or row[1]), partial(self.app._open_bookmark, row), text=row[2] or row[1], help=row[1])
+
 class BookmarkApp(App):
     CSS_PATH = "app.tcss"
+    COMMANDS = App.COMMANDS | {BookmarkCommands}
     BINDINGS = [
         ("q", "quit", "Quit"),
         ("a", "add", "Add Bookmark"),
@@ -20,6 +215,7 @@ class BookmarkApp(App):
         ("up", "up", "Up"),
         ("down", "down", "Down"),
         ("enter", "enter", "Select"),
+        ("o", "quick_open", "Quick Open"),
     ]
 
     def compose(self) -> ComposeResult:
@@ -39,6 +235,8 @@ class BookmarkApp(App):
             Button("Sort", id="sort_btn", flat=True),
             Button("Tags", id="tags_btn", flat=True),
             Button("Info", id="info_btn", flat=True),
+            Button("Health", id="health_btn", flat=True),
+            Button("Stats", id="stats_btn", flat=True),
             id="menu_bar"
         )
         yield Container(id="main_area")
@@ -48,58 +246,168 @@ class BookmarkApp(App):
         self.title = "LinkDB"
         self.sub_title = "Save links easily"
         self._sort_mode = getattr(self, '_sort_mode', 'id_asc')
+        self._home_view = None
+        self._home_list = None
+        self._search_timer = None
+        self._search_update_lock = asyncio.Lock()
+        self._refresh_wake = threading.Event()
         self.show_main_list()
+        self.load_repository()
+        self.watch_database()
+        self.refresh_titles()
+
+    @work(thread=True, group="repository")
+    def load_repository(self):
+        # Warm the in-memory model so the first edit or tags screen doesn't wait
+        import repository
+        repository.ensure_loaded()
+
+    WATCH_INTERVAL = 1.0
+
+    @work(thread=True, group="watcher")
+    def watch_database(self):
+        # Other instances and CLI commands write to the same file; poll for
+        # their commits and patch in just the rows they changed
+        import sqlite3
+        import time
+        import repository
+        worker = get_current_worker()
+        while not worker.is_cancelled:
+            time.sleep(self.WATCH_INTERVAL)
+            try:
+                ids = repository.refresh()
+            except sqlite3.OperationalError:
+                continue
+            if ids is None:
+                self.call_from_thread(self._reload_views)
+            elif ids:
+                self.call_from_thread(self._apply_external_changes, ids)
+
+    def _apply_external_changes(self, ids):
+        rows = get_bookmarks(ids)
+        for row in rows:
+            for item in self.query(f"#bookmark_item_{row[0]}"):
+                item.update_bookmark(row)
+        present = {row[0] for row in rows}
+        if self._home_list is None and present:
+            # Only the empty placeholder is showing; build the real list
+            self._reload_views()
+            return
+        self._home_upsert(sorted(present))
+        self._home_remove([bid for bid in ids if bid not in present])
 
-    def show_main_list(self, tag_filter=None):
+    def _reload_views(self):
+        visible = self._home_view is not None and self._home_view.display
+        tag_filter = self._home_view.tag_filter if self._home_view is not None else None
+        health_filter = self._home_view.health_filter if self._home_view is not None else None
+        self._drop_home_view()
+        if visible:
+            self.show_main_list(tag_filter, health_filter)
+
+    REFRESH_INTERVAL = 60
+
+    @work(thread=True, group="refresh")
+    def refresh_titles(self):
+        # Fetches pending titles, retries failed ones and re-checks stale ones
+        # as they come due (see refresher.py)
+        import sqlite3
+        import refresher
+        worker = get_current_worker()
+        while not worker.is_cancelled:
+            self._refresh_wake.clear()
+            try:
+                fetched = refresher.refresh_due(on_titles=self._titles_changed, should_stop=lambda: worker.is_cancelled)
+            except sqlite3.OperationalError:
+                fetched = 0
+            if not fetched:
+                for _ in range(self.REFRESH_INTERVAL):
+                    if worker.is_cancelled or self._refresh_wake.wait(1):
+                        break
+
+    def resolve_titles(self):
+        # Newly added links are due at once; start the scheduler's next pass now
+        self._refresh_wake.set()
+
+    def _titles_changed(self, titles):
+        self.call_from_thread(self._update_bookmark_titles, titles)
+
+    def _update_bookmark_titles(self, titles):
+        # Relabel just the affected rows on whichever screen is showing them
+        for bid, title in titles:
+            for item in self.query(f"#bookmark_item_{bid}"):
+                bookmark = item.bookmark
+                item.update_bookmark(bookmark[:2] + (title,) + bookmark[3:])
+
+    def _open_bookmark(self, bookmark):
+        webbrowser.open(bookmark[1])
+        bid = bookmark[0]
+        record_visit(bid)
+        if self._home_list is not None and self._home_list.sort in ("visited_desc", "visits_desc", "frecency_desc"):
+            self._home_upsert([bid])
+
+    def _clear_main_area(self):
+        # The home view is kept (hidden) while other screens are shown so that
+        # changes can be applied to it in place instead of rebuilding it
         main_area = self.query_one("#main_area", Container)
-        # Explicitly remove all children and refresh to avoid duplicate IDs
         for child in list(main_area.children):
-            child.remove()
+            if child is self._home_view:
+                child.display = False
+            else:
+                child.remove()
         main_area.refresh()
+        return main_area
+
+    def _drop_home_view(self):
+        if self._home_view is not None:
+            self._home_view.remove()
+        self._home_view = None
+        self._home_list = None
+
+    def _home_upsert(self, ids):
+        if self._home_list is not None:
+            self.call_later(self._home_list.upsert, get_bookmarks(ids))
+        elif ids:
+            # The empty placeholder has no list to insert into yet
+            self._drop_home_view()
+
+    def _home_remove(self, ids):
+        if self._home_list is not None:
+            self.call_later(self._home_list.remove_bookmarks, ids)
+
+    def show_main_list(self, tag_filter=None, health_filter=None):
+        mode = getattr(self, '_sort_mode', 'id_asc')
+        home = self._home_view
+        if home is not None and home.tag_filter == tag_filter and home.health_filter == health_filter:
+            self._clear_main_area()
+            home.display = True
+            if self._home_list is not None and self._home_list.sort != mode:
+                self.call_later(self._home_list.resort, mode)
+            return
+        self._drop_home_view()
+        main_area = self._clear_main_area()
         import uuid
         unique = str(uuid.uuid4())[:8]
-        folders, bookmarks = get_folders_and_bookmarks()
-        if tag_filter:
-            bookmarks = [
-                b for b in bookmarks
-                if tag_filter in [t.strip() for t in (b[5] or '').replace(';', ',').replace(' ', ',').split(',') if t.strip()]
-            ]
-        # Sort bookmarks according to self._sort_mode
-        mode = getattr(self, '_sort_mode', 'id_asc')
-        if mode == "id_asc":
-            bookmarks = sorted(bookmarks, key=lambda b: b[0])
-        elif mode == "id_desc":
-            bookmarks = sorted(bookmarks, key=lambda b: b[0], reverse=True)
-        elif mode == "title_az":
-            bookmarks = sorted(bookmarks, key=lambda b: (b[2] or '').lower())
-        elif mode == "title_za":
-            bookmarks = sorted(bookmarks, key=lambda b: (b[2] or '').lower(), reverse=True)
+        folders = get_folder_children(None)
+        bookmarks = get_bookmarks_page(mode, limit=BookmarkList.PAGE_SIZE + 1, tag=tag_filter, health=health_filter)
         list_items = []
         if folders:
             list_items.append(Static("Folders:"))
-            for fid, name in folders:
-                list_items.append(Static(f"📁 {name}", id=f"folder_{fid}"))
+            list_items.append(FolderTree(folders, id=f"folder_tree_{unique}"))
         if bookmarks:
             list_items.append(Static("Bookmarks:"))
-            bookmark_items = []
-            for bid, url, title, folder_id, color, tags in bookmarks:
-                display = f"[ID:{bid}] [{color}]{title or ''}[/{color}]"
-                item = ListItem(Label(display, id=f"bookmark_{bid}"), id=f"bookmark_item_{bid}")
-                item.url = url
-                item.tags = tags
-                bookmark_items.append(item)
             # Use a unique ID for the ListView to avoid DuplicateIds
-            list_items.append(ListView(*bookmark_items, id=f"bookmark_list_{unique}"))
+            self._home_list = BookmarkList(bookmarks, mode, tag_filter, health_filter, id=f"bookmark_list_{unique}")
+            list_items.append(self._home_list)
         if not folders and not bookmarks:
             list_items.append(Static("No folders or bookmarks yet.", id="empty_label"))
-        for item in list_items:
-            main_area.mount(item)
+        self._home_view = Container(*list_items, id=f"home_view_{unique}")
+        self._home_view.tag_filter = tag_filter
+        self._home_view.health_filter = health_filter
+        main_area.mount(self._home_view)
         self._main_list_unique = unique
 
     def show_add_form(self):
-        main_area = self.query_one("#main_area", Container)
-        for child in list(main_area.children):
-            child.remove()
+        main_area = self._clear_main_area()
         import uuid
         unique = str(uuid.uuid4())[:8]
         main_area.mount(
@@ -113,37 +421,15 @@ class BookmarkApp(App):
         self._add_form_ids = unique
 
     def show_edit_form(self, item):
-        main_area = self.query_one("#main_area", Container)
-        for child in list(main_area.children):
-            child.remove()
+        main_area = self._clear_main_area()
         import uuid
-        import re
         from textual.widgets import Select
         unique = str(uuid.uuid4())[:8]
-        url = getattr(item, "url", "")
-        label_widget = item.query_one("Label")
-        display = getattr(label_widget, "renderable", getattr(label_widget, "text", ""))
-        color_title = re.search(r"\[\w+\](.*?)\[/\w+\]", display)
-        color = re.search(r"\[(\w+)\].*?\[/\w+\]", display)
-        if color_title and color:
-            title = color_title.group(1).strip()
-            color = color.group(1)
-        else:
-            title = display.strip()
-            color = "white"
-        # Fallback: if title is blank, get from DB
-        tags = ""
-        if not title or not hasattr(item, "tags"):
-            from db import get_folders_and_bookmarks
-            _, bookmarks = get_folders_and_bookmarks()
-            for bid, b_url, b_title, folder_id, b_color, b_tags in bookmarks:
-                if b_url == url:
-                    title = b_title or url
-                    color = b_color or "white"
-                    tags = b_tags or ""
-                    break
-        else:
-            tags = getattr(item, "tags", "")
+        # Current values come from the repository, not the (possibly stale) label
+        bid, url, title, folder_id, color, tags = get_bookmark(item.bookmark[0]) or item.bookmark
+        title = title or url
+        color = color or "white"
+        tags = tags or ""
         color_options = [
             ("Red", "red"),
             ("Green", "green"),
@@ -163,102 +449,103 @@ class BookmarkApp(App):
             Static("", id=f"edit_error_{unique}")
         )
         self._edit_form_ids = unique
-        self._edit_url = url
+        self._edit_id = item.bookmark[0]
+
+    SEARCH_DEBOUNCE = 0.15
 
     def show_search_ui(self, query: str = ""):
-        main_area = self.query_one("#main_area", Container)
-        # Remove all children and refresh to avoid duplicate IDs
-        for child in list(main_area.children):
-            child.remove()
-        main_area.refresh()
+        main_area = self._clear_main_area()
         import uuid
         unique = str(uuid.uuid4())[:8]
-        # Only show the search bar and buttons initially
+        # Results update as you type; Enter moves focus to the list
         main_area.mount(
             Static("Search Bookmarks", id=f"search_form_title_{unique}"),
-            Input(value=query, placeholder="Type to search (title or url)", id=f"search_input_{unique}"),
+            Input(value=query, placeholder="Type to search (title, url or tags)", id=f"search_input_{unique}"),
+            Static("", id=f"search_status_{unique}"),
+            ListView(id=f"bookmark_list_search_{unique}"),
             Button("Back", id=f"search_back_btn_{unique}", flat=True),
             Button("Main Menu", id=f"main_menu_btn_{unique}", variant="primary", flat=True)
         )
         self._search_form_ids = unique
+        self._search_shown = None
+        self._cancel_search()
+        self.call_later(self.run_search, query)
         # Always focus the search input
         self.call_later(self._focus_search_ui, False, unique)
 
     def show_search_results(self, query: str):
-        main_area = self.query_one("#main_area", Container)
-        for child in list(main_area.children):
-            child.remove()
-        main_area.refresh()
-        import uuid
-        unique = str(uuid.uuid4())[:8]
-        from db import get_folders_and_bookmarks
-        _, bookmarks = get_folders_and_bookmarks()
-        q = (query or "").strip().lower()
-        results = []
-        def match(bookmark):
-            bid, url, title, folder_id, color, tags = bookmark
-            t = (title or "").strip().lower()
-            u = (url or "").strip().lower()
-            for word in q.split():
-                if word not in t and word not in u:
-                    return False
-            return True
-        filtered = list(filter(match, bookmarks))
-        for bid, url, title, folder_id, color, tags in filtered:
-            display = f"[ID:{bid}] [{color}]{title or ''}[/{color}]"
-            item = ListItem(Label(display, id=f"bookmark_{bid}"), id=f"bookmark_item_{bid}")
-            item.url = url
-            item.tags = tags
-            results.append(item)
-        main_area.mount(
-            Static(f"Results for: '{query}'", id=f"search_results_title_{unique}"),
-        )
-        if results:
-            main_area.mount(ListView(*results, id=f"bookmark_list_search_{unique}"))
-        else:
-            main_area.mount(Static("No bookmarks found.", id=f"search_no_results_{unique}"))
-        main_area.mount(
-            Button("Back", id=f"search_back_btn_{unique}", flat=True),
-            Button("Main Menu", id=f"main_menu_btn_{unique}", variant="primary", flat=True)
-        )
-        self._search_form_ids = unique
-        self.call_later(self._focus_search_ui, bool(results), unique)
+        self.show_search_ui(query)
 
     def _focus_search_ui(self, has_results, unique):
         try:
             if has_results:
-                self.query_one("#bookmark_list_search", ListView).focus()
+                self.query_one(f"#bookmark_list_search_{unique}", ListView).focus()
             else:
                 self.query_one(f"#search_input_{unique}", Input).focus()
         except Exception:
             pass
 
-    def on_key(self, event):
-        # Only handle bookmarks list navigation and Enter
-        bookmark_list = self.get_active_bookmark_list()
-        unique = getattr(self, '_search_form_ids', None)
-        search_input_id = f"search_input_{unique}" if unique else None
-        search_input = None
-        if unique and search_input_id:
-            try:
-                search_input = self.query_one(f"#{search_input_id}", Input)
-            except Exception:
-                pass
-        if search_input and search_input.has_focus:
-            if event.key == "enter":
-                query = search_input.value.strip()
-                self.show_search_results(query)
-                return
-            elif len(event.key) == 1 or event.key in ("backspace", "delete"):
-                # Do not update results live, just update input
-                return
-        if bookmark_list and bookmark_list.has_focus:
-            if event.key == "enter":
-                selected = bookmark_list.index
-                if selected is not None and selected >= 0:
-                    item = bookmark_list.children[selected]
-                    if hasattr(item, "url"):
-                        webbrowser.open(item.url)
+    def on_input_changed(self, event: Input.Changed) -> None:
+        if not str(event.input.id).startswith("search_input_"):
+            return
+        from db import search_from_cache
+        query = event.value.strip()
+        rows = search_from_cache(query)
+        if rows:
+            # Cached or narrowed from an earlier result: no need to wait
+            self._cancel_search()
+            self.call_later(self._show_search_rows, self._search_form_ids, query, rows)
+            return
+        if self._search_timer is not None:
+            self._search_timer.stop()
+        self._search_timer = self.set_timer(self.SEARCH_DEBOUNCE, lambda: self.run_search(query))
+
+    def _cancel_search(self):
+        if getattr(self, "_search_timer", None) is not None:
+            self._search_timer.stop()
+        self._search_timer = None
+        self.workers.cancel_group(self, "search")
+
+    def run_search(self, query):
+        self._search_timer = None
+        self._search_worker(self._search_form_ids, query)
+
+    @work(thread=True, exclusive=True, group="search")
+    def _search_worker(self, unique, query):
+        from db import search_bookmarks_cached, fuzzy_search
+        rows = search_bookmarks_cached(query)
+        fuzzy = not rows and bool(query)
+        if fuzzy and not get_current_worker().is_cancelled:
+            # Nothing matches exactly; fall back to typo-tolerant matching
+            rows = fuzzy_search(query)
+        # A newer keystroke replaced this search; drop the result
+        if not get_current_worker().is_cancelled:
+            self.call_from_thread(self._show_search_rows, unique, query, rows, fuzzy)
+
+    async def _show_search_rows(self, unique, query, rows, fuzzy=False):
+        if unique != getattr(self, "_search_form_ids", None):
+            return
+        try:
+            search_input = self.query_one(f"#search_input_{unique}", Input)
+            results = self.query_one(f"#bookmark_list_search_{unique}", ListView)
+            status = self.query_one(f"#search_status_{unique}", Static)
+        except Exception:
+            return
+        if search_input.value.strip() != query:
+            return
+        if not query:
+            status.update("Recently added")
+        elif fuzzy and rows:
+            status.update(f"No exact matches for '{query}', closest {len(rows)}:")
+        else:
+            status.update(f"{len(rows)} results for: '{query}'" if rows else "No bookmarks found.")
+        ids = [row[0] for row in rows]
+        # Worker results and cache hits arrive by different routes; rebuild one at a time
+        async with self._search_update_lock:
+            if search_input.value.strip() == query and self._search_shown != (query, ids):
+                self._search_shown = (query, ids)
+                await results.clear()
+                await results.extend([BookmarkItem(row) for row in rows])
 
     def action_search(self):
         self.show_search_ui()
@@ -300,6 +587,18 @@ class BookmarkApp(App):
             self.show_main_list()
         elif event.button.id == "info_btn":
             self.show_info_menu()
+        elif event.button.id == "stats_btn":
+            self.show_stats_menu()
+        elif event.button.id.startswith("stats_save_btn"):
+            import profiling
+            profiling.dump("linkdb-profile.json")
+            self.notify("Saved profile to linkdb-profile.json")
+        elif event.button.id.startswith("stats_reset_btn"):
+            import profiling
+            profiling.reset()
+            self.show_stats_menu()
+        elif event.button.id.startswith("stats_back_btn"):
+            self.show_main_list()
         elif event.button.id.startswith("save_btn"):
             unique = getattr(self, '_add_form_ids', '')
             links_input_id = f"links_input_{unique}"
@@ -307,7 +606,7 @@ class BookmarkApp(App):
             error_id = f"add_error_{unique}"
             links_text = self.query_one(f"#{links_input_id}", Input).value
             tags_text = self.query_one(f"#{tags_input_id}", Input).value
-            tags = ','.join([t.strip() for t in tags_text.replace(';',',').replace(' ', ',').split(',') if t.strip()])
+            tags = ','.join(split_tags(tags_text))
             if not tags:
                 tags = 'main'
             if links_text:
@@ -316,9 +615,14 @@ class BookmarkApp(App):
                 if not tags:
                     self.query_one(f"#{error_id}", Static).update("At least one tag is required.")
                     return
-                for url in urls:
-                    add_bookmark(url, tags=tags)
+                from repository import find_bookmark
+                existing = [bid for bid in map(find_bookmark, urls) if bid is not None]
+                ids = add_bookmarks(urls, tags=tags, fetch=False)
+                # Already saved links had the new tags merged in
+                self._home_upsert(sorted(set(ids + existing)))
                 self.show_main_list()
+                if ids:
+                    self.resolve_titles()
             else:
                 self.query_one(f"#{error_id}", Static).update("Links are required.")
                 return
@@ -333,24 +637,27 @@ class BookmarkApp(App):
             title = self.query_one(f"#{title_input_id}", Input).value.strip()
             color = self.query_one(f"#{color_input_id}", Select).value
             tags = self.query_one(f"#{tags_input_id}", Input).value
-            tags = ','.join([t.strip() for t in tags.replace(';',',').replace(' ', ',').split(',') if t.strip()])
+            tags = ','.join(split_tags(tags))
             if not tags:
                 tags = 'main'
-            url = getattr(self, '_edit_url', '')
+            bid = getattr(self, '_edit_id', None)
             if not title:
                 self.query_one(f"#{error_id}", Static).update("Title cannot be blank.")
                 return
-            if url:
+            if bid is not None:
                 from db import update_bookmark
-                update_bookmark(url, title, color, tags)
+                update_bookmark(bid, title, color, tags)
+                self._home_upsert([bid])
             self.show_main_list()
         elif event.button.id.startswith("edit_cancel_btn"):
             self.show_main_list()
         elif event.button.id.startswith("delete_yes_btn"):
-            url = getattr(self, '_pending_delete_url', None)
-            if url:
+            bid = getattr(self, '_pending_delete_id', None)
+            if bid is not None:
                 from db import delete_bookmark
-                delete_bookmark(url)
+                delete_bookmark(bid)
+                self._home_remove([bid])
+                self._pending_delete_id = None
             self.show_main_list()
         elif event.button.id.startswith("delete_no_btn"):
             self.show_main_list()
@@ -365,6 +672,19 @@ class BookmarkApp(App):
         elif event.button.id.startswith("tag_btn_"):
             tag = event.button.label
             self.show_main_list(tag_filter=tag)
+        elif event.button.id == "health_btn":
+            self.show_health_menu()
+        elif event.button.id.startswith("health_filter_btn"):
+            unique = getattr(self, '_health_menu_ids', None)
+            try:
+                select = self.query_one(f"#health_select_{unique}", Select)
+                self.show_main_list(health_filter=select.value if isinstance(select.value, int) else None)
+            except Exception:
+                self.show_main_list()
+        elif event.button.id.startswith("health_check_btn"):
+            self.check_links()
+        elif event.button.id.startswith("health_back_btn"):
+            self.show_main_list()
         elif event.button.id.startswith("tags_filter_btn"):
             unique = getattr(self, '_tags_menu_ids', None)
             select_id = f"tags_select_{unique}"
@@ -376,9 +696,7 @@ class BookmarkApp(App):
                 self.show_main_list()
 
     def show_sort_menu(self):
-        main_area = self.query_one("#main_area", Container)
-        for child in list(main_area.children):
-            child.remove()
+        main_area = self._clear_main_area()
         import uuid
         unique = str(uuid.uuid4())[:8]
         sort_options = [
@@ -386,6 +704,11 @@ class BookmarkApp(App):
             ("ID Descending (Newest)", "id_desc"),
             ("Title A-Z", "title_az"),
             ("Title Z-A", "title_za"),
+            ("Date Added (Newest)", "added_desc"),
+            ("Last Visited", "visited_desc"),
+            ("Most Visited", "visits_desc"),
+            ("Link Health (Broken First)", "health_desc"),
+            ("Frecency (Most Used)", "frecency_desc"),
         ]
         main_area.mount(
             Static("Sort Bookmarks", id=f"sort_menu_title_{unique}"),
@@ -396,33 +719,63 @@ class BookmarkApp(App):
         self._sort_menu_ids = unique
 
     def show_tags_menu(self):
-        main_area = self.query_one("#main_area", Container)
-        for child in list(main_area.children):
-            child.remove()
+        main_area = self._clear_main_area()
         import uuid
         unique = str(uuid.uuid4())[:8]
-        from db import get_folders_and_bookmarks
-        _, bookmarks = get_folders_and_bookmarks()
-        tag_set = set()
-        for _, _, _, _, _, tags in bookmarks:
-            for tag in (tags or '').replace(';', ',').replace(' ', ',').split(','):
-                tag = tag.strip()
-                if tag:
-                    tag_set.add(tag)
-        tag_list = sorted(tag_set)
+        tag_counts = get_tag_counts()
         main_area.mount(Static("Filter by Tag", id=f"tags_menu_title_{unique}"))
-        if tag_list:
-            main_area.mount(Select(options=[(tag, tag) for tag in tag_list], id=f"tags_select_{unique}"))
+        if tag_counts:
+            main_area.mount(Select(options=[(f"{tag} ({count})", tag) for tag, count in tag_counts], id=f"tags_select_{unique}"))
             main_area.mount(Button("Filter", id=f"tags_filter_btn_{unique}", flat=True))
         else:
             main_area.mount(Static("No tags found.", id=f"tags_menu_empty_{unique}"))
         main_area.mount(Button("Back", id=f"tags_back_btn_{unique}", flat=True))
         self._tags_menu_ids = unique
 
+    def show_health_menu(self):
+        main_area = self._clear_main_area()
+        import uuid
+        unique = str(uuid.uuid4())[:8]
+        counts = get_health_counts()
+        main_area.mount(Static("Link Health", id=f"health_menu_title_{unique}"))
+        main_area.mount(Select(options=[(f"{HEALTH_NAMES[health]} ({count})", health) for health, count in counts], id=f"health_select_{unique}"))
+        main_area.mount(Button("Filter", id=f"health_filter_btn_{unique}", flat=True))
+        main_area.mount(Button("Check links", id=f"health_check_btn_{unique}", flat=True))
+        main_area.mount(Static("", id=f"health_status_{unique}"))
+        main_area.mount(Button("Back", id=f"health_back_btn_{unique}", flat=True))
+        self._health_menu_ids = unique
+
+    @work(thread=True, exclusive=True, group="linkcheck")
+    def check_links(self):
+        # Checks links not checked in the last week; progress goes to the
+        # Health screen if it is showing
+        import linkcheck
+        worker = get_current_worker()
+        done = 0
+
+        def progress(recorded):
+            nonlocal done
+            done += len(recorded)
+            self.call_from_thread(self._set_health_status, f"Checked {done} links...")
+
+        counts = linkcheck.check_all(on_results=progress, should_stop=lambda: worker.is_cancelled)
+        summary = ", ".join(f"{counts[health]} {name}" for health, name in enumerate(HEALTH_NAMES) if counts[health])
+        self.call_from_thread(self._links_checked, f"Checked {done} links" + (f": {summary}" if summary else ""))
+
+    def _set_health_status(self, text):
+        for status in self.query(f"#health_status_{getattr(self, '_health_menu_ids', None)}"):
+            status.update(text)
+
+    def _links_checked(self, text):
+        self._set_health_status(text)
+        self.notify(text)
+        home = self._home_view
+        if home is not None and (home.health_filter is not None or self._sort_mode == "health_desc"):
+            # Health changed under the list's sort or filter; rebuild it
+            self._reload_views()
+
     def show_info_menu(self):
-        main_area = self.query_one("#main_area", Container)
-        for child in list(main_area.children):
-            child.remove()
+        main_area = self._clear_main_area()
         import uuid
         unique = str(uuid.uuid4())[:8]
         main_area.mount(
@@ -432,16 +785,41 @@ class BookmarkApp(App):
         )
         self._sort_menu_ids = unique
 
+    def show_stats_menu(self):
+        import profiling
+        main_area = self._clear_main_area()
+        import uuid
+        unique = str(uuid.uuid4())[:8]
+        if profiling.ENABLED:
+            main_area.mount(
+                Static("\n".join(profiling.summary_lines()), markup=False, id=f"stats_table_{unique}"),
+                Button("Save JSON", id=f"stats_save_btn_{unique}", flat=True),
+                Button("Reset", id=f"stats_reset_btn_{unique}", flat=True),
+            )
+        else:
+            main_area.mount(Label("Profiling is off. Start LinkDB with --profile or LINKDB_PROFILE=1 to collect stats.", id=f"stats_off_{unique}"))
+        main_area.mount(Button("Back", id=f"stats_back_btn_{unique}", flat=True))
+        self._stats_menu_ids = unique
+
     def get_active_bookmark_list(self):
         main_area = self.query_one("#main_area", Container)
+        if self._home_view is not None and self._home_view.display:
+            return self._home_list
         # Accept any ListView with id starting with 'bookmark_list'
         for child in main_area.children:
             if isinstance(child, ListView) and str(child.id).startswith("bookmark_list"):
                 return child
         return None
 
+    def _on_base_screen(self):
+        # Keys typed into a pushed screen (the quick-open palette) still bubble
+        # here, and the home list keeps reporting focus underneath it
+        return self.screen is self.screen_stack[0]
+
     def on_key(self, event):
         # Only handle bookmarks list navigation and Enter
+        if not self._on_base_screen():
+            return
         bookmark_list = self.get_active_bookmark_list()
         unique = getattr(self, '_search_form_ids', None)
         search_input_id = f"search_input_{unique}" if unique else None
@@ -454,10 +832,10 @@ class BookmarkApp(App):
         if search_input and search_input.has_focus:
             if event.key == "enter":
                 query = search_input.value.strip()
-                self.show_search_results(query)
-                return
-            elif len(event.key) == 1 or event.key in ("backspace", "delete"):
-                # Do not update results live, just update input
+                if self._search_shown is None or self._search_shown[0] != query:
+                    self._cancel_search()
+                    self.run_search(query)
+                self._focus_search_ui(bool(self._search_shown and self._search_shown[1]), unique)
                 return
         if bookmark_list and bookmark_list.has_focus:
             if event.key == "enter":
@@ -465,27 +843,31 @@ class BookmarkApp(App):
                 if selected is not None and selected >= 0:
                     item = bookmark_list.children[selected]
                     if hasattr(item, "url"):
-                        webbrowser.open(item.url)
+                        self._open_bookmark(item.bookmark)
 
-    def action_up(self):
+    async def action_up(self):
         bookmark_list = self.get_active_bookmark_list()
         if bookmark_list:
-            bookmark_list.action_cursor_up()
+            await bookmark_list.run_action("cursor_up")
 
-    def action_down(self):
+    async def action_down(self):
         bookmark_list = self.get_active_bookmark_list()
         if bookmark_list:
-            bookmark_list.action_cursor_down()
+            await bookmark_list.run_action("cursor_down")
 
     def action_enter(self):
+        if not self._on_base_screen():
+            return
         bookmark_list = self.get_active_bookmark_list()
         if bookmark_list:
             selected = bookmark_list.index
             if selected is not None and selected >= 0:
                 item = bookmark_list.children[selected]
                 if hasattr(item, "url"):
-                    import webbrowser
-                    webbrowser.open(item.url)
+                    self._open_bookmark(item.bookmark)
+
+    def action_quick_open(self):
+        self.push_screen(CommandPalette(providers=[BookmarkCommands], placeholder="Open a bookmark…"))
 
     def action_add(self):
         self.show_add_form()
@@ -506,13 +888,11 @@ class BookmarkApp(App):
             if selected is not None and selected >= 0:
                 item = bookmark_list.children[selected]
                 if hasattr(item, "url"):
-                    self._pending_delete_url = item.url
+                    self._pending_delete_id = item.bookmark[0]
                     self.show_delete_confirm()
 
     def show_delete_confirm(self):
-        main_area = self.query_one("#main_area", Container)
-        for child in list(main_area.children):
-            child.remove()
+        main_area = self._clear_main_area()
         import uuid
         unique = str(uuid.uuid4())[:8]
         main_area.mount(
@@ -522,8 +902,12 @@ class BookmarkApp(App):
         )
         self._delete_confirm_ids = unique
 
+    def on_tree_node_selected(self, event):
+        data = event.node.data
+        if data and data[0] == "bookmark":
+            self._open_bookmark(data[1])
+
     def on_list_view_item_selected(self, event):
         item = event.item
         if hasattr(item, "url"):
-            import webbrowser
-            webbrowser.open(item.url)
+            self._open_bookmark(item.bookmark)
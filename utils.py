@@ -1,12 +1,286 @@
-import requests
-from bs4 import BeautifulSoup
+import codecs
+import re
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from email.utils import parsedate_to_datetime
+from functools import partial
+from html.parser import HTMLParser
+from urllib.parse import urlsplit
+import profiling
+
+# Titles live in <head>; never read more than this much of a page looking for one
+MAX_TITLE_BYTES = 256 * 1024
+HTML_TYPES = ("text/html", "application/xhtml+xml")
+
+# Outcome of one fetch. status is the HTTP status (304 when the validators
+# still match), or 0 when no response came back; title is None unless a 200
+# HTML page had one.
+# When capturing for the archive, text (and html with capture="html") hold
+# the page's readable text and markup.
+Page = namedtuple("Page", "title status etag last_modified retry_after error text html", defaults=(None, None))
+# Captures read further into the page than title lookups, up to this much
+MAX_CAPTURE_BYTES = 2 * 1024 * 1024
+# Outcome of a link check: final status (0 if unreachable), the URL after
+# redirects, how many redirects were followed and time to the response
+Link = namedtuple("Link", "status final_url redirects latency_ms error")
+CHECK_TIMEOUT = 10
+# A ranged GET whose server ignores the Range header is abandoned after this
+CHECK_MAX_BYTES = 64 * 1024
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            # requests is only imported once something is actually fetched
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            # Keep pools for many hosts so link checks interleaving hosts still
+            # reuse their connections
+            adapter = HTTPAdapter(pool_connections=256, pool_maxsize=32)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            if profiling.ENABLED:
+                profiling.instrument_network()
+            _session = session
+    return _session
+
+class TitleParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title = None
+        self.og_title = None
+        self.done = False
+        self._in_title = False
+        self._parts = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "title" and self.title is None:
+            self._in_title = True
+        elif tag == "meta" and not self.og_title:
+            attrs = dict(attrs)
+            if "og:title" in (attrs.get("property"), attrs.get("name")) and attrs.get("content"):
+                self.og_title = " ".join(attrs["content"].split())
+        elif tag == "body":
+            self.done = True
+
+    def handle_endtag(self, tag):
+        if tag == "title" and self._in_title:
+            self._in_title = False
+            self.title = " ".join("".join(self._parts).split())
+            self.done = bool(self.title)
+        elif tag == "head":
+            self.done = True
+
+    def handle_data(self, data):
+        if self._in_title:
+            self._parts.append(data)
+
+class TextParser(TitleParser):
+    # Title lookup plus the page's visible text, one line per block element
+    SKIPPED = {"script", "style", "noscript", "template", "svg", "head", "iframe"}
+    BLOCKS = {"p", "div", "br", "li", "tr", "h1", "h2", "h3", "h4", "h5", "h6", "pre", "blockquote", "section", "article", "header", "footer", "table", "ul", "ol", "dd", "dt"}
+
+    def __init__(self):
+        super().__init__()
+        self._skip = 0
+        self._lines = []
+        self._line = []
+
+    def handle_starttag(self, tag, attrs):
+        super().handle_starttag(tag, attrs)
+        if tag == "body":
+            # Whatever was left open in <head> ends here
+            self._skip = 0
+        elif tag in self.SKIPPED:
+            self._skip += 1
+        elif tag in self.BLOCKS:
+            self._break()
+
+    def handle_endtag(self, tag):
+        super().handle_endtag(tag)
+        if tag in self.SKIPPED:
+            self._skip = max(0, self._skip - 1)
+        elif tag in self.BLOCKS:
+            self._break()
+
+    def handle_data(self, data):
+        super().handle_data(data)
+        if not self._skip:
+            self._line.append(data)
+
+    def _break(self):
+        line = " ".join("".join(self._line).split())
+        if line:
+            self._lines.append(line)
+        self._line = []
+
+    def text(self):
+        self._break()
+        return "\n".join(self._lines)
+
+def retry_after(value):
+    # Seconds to wait from a Retry-After header (delta-seconds or an HTTP date)
+    if not value:
+        return None
+    if value.strip().isdigit():
+        return int(value)
+    try:
+        return max(0, int(parsedate_to_datetime(value).timestamp() - time.time()))
+    except (TypeError, ValueError):
+        return None
+
+def fetch_page(url, etag=None, last_modified=None, capture=None):
+    # Conditional GET when validators from an earlier fetch are given.
+    # capture="text" or "html" keeps reading past the title for the archive.
+    start = time.perf_counter()
+    read = 0
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    try:
+        with get_session().get(url, timeout=5, stream=True, headers=headers) as response:
+            headers_done = time.perf_counter()
+            status = response.status_code
+            validators = (response.headers.get("ETag") or etag, response.headers.get("Last-Modified") or last_modified)
+            if status == 304:
+                return Page(None, status, *validators, None, None)
+            if status >= 400:
+                return Page(None, status, etag, last_modified, retry_after(response.headers.get("Retry-After")), response.reason)
+            content_type = response.headers.get("Content-Type", "")
+            mime = content_type.split(";")[0].strip().lower()
+            if mime and mime not in HTML_TYPES:
+                return Page(None, status, *validators, None, None)
+            charset = re.search(r"charset=[\"']?([\w.:-]+)", content_type, re.I)
+            try:
+                decoder = codecs.getincrementaldecoder(charset.group(1) if charset else "utf-8")(errors="replace")
+            except LookupError:
+                decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            parser = TextParser() if capture else TitleParser()
+            limit = MAX_CAPTURE_BYTES if capture else MAX_TITLE_BYTES
+            markup = [] if capture == "html" else None
+            for chunk in response.iter_content(chunk_size=8192):
+                text = decoder.decode(chunk)
+                parser.feed(text)
+                if markup is not None:
+                    markup.append(text)
+                read += len(chunk)
+                if (parser.done and not capture) or read >= limit:
+                    break
+            if profiling.ENABLED:
+                profiling.record("fetch.headers", headers_done - start)
+                profiling.record("fetch.transfer", time.perf_counter() - headers_done, bytes=read)
+            title = parser.title or parser.og_title or None
+            if capture:
+                return Page(title, status, *validators, None, None, parser.text(), "".join(markup) if markup is not None else None)
+            return Page(title, status, *validators, None, None)
+    except Exception as e:
+        return Page(None, 0, etag, last_modified, None, type(e).__name__)
+    finally:
+        if profiling.ENABLED:
+            profiling.record("fetch.title", time.perf_counter() - start)
 
 def fetch_title(url):
+    return fetch_page(url).title or url
+
+def check_link(url):
+    start = time.perf_counter()
+    session = get_session()
+    try:
+        try:
+            response = session.head(url, timeout=CHECK_TIMEOUT, allow_redirects=True)
+            response.close()
+        except Exception:
+            # Some servers reset or time out on HEAD but answer GET
+            response = None
+        if response is None or response.status_code >= 400:
+            # Plenty of servers reject or mishandle HEAD; ask for one byte instead
+            with session.get(url, timeout=CHECK_TIMEOUT, allow_redirects=True, stream=True, headers={"Range": "bytes=0-0"}) as response:
+                read = 0
+                # Draining a short body lets the connection go back to the pool
+                for chunk in response.iter_content(chunk_size=8192):
+                    read += len(chunk)
+                    if read >= CHECK_MAX_BYTES:
+                        break
+        latency_ms = round((time.perf_counter() - start) * 1000)
+        error = response.reason if response.status_code >= 400 else None
+        return Link(response.status_code, response.url, len(response.history), latency_ms, error)
+    except Exception as e:
+        return Link(0, url, 0, round((time.perf_counter() - start) * 1000), type(e).__name__)
+    finally:
+        if profiling.ENABLED:
+            profiling.record("fetch.check", time.perf_counter() - start)
+
+def url_host(url):
+    # Lower-cased host[:port] that requests are grouped and limited by
     try:
-        response = requests.get(url, timeout=5)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-        title = soup.title.string.strip() if soup.title and soup.title.string else url
-        return title
-    except Exception:
-        return url
+        return urlsplit(url).netloc.lower()
+    except ValueError:
+        # Malformed URLs can't be fetched anyway; the request just fails
+        return ""
+
+class HostLimiter:
+    # At most per_host requests in flight to one host, each started at least
+    # delay seconds after the previous one
+    def __init__(self, per_host=4, delay=0.0):
+        self.per_host = per_host
+        self.delay = delay
+        self._lock = threading.Lock()
+        self._hosts = {}
+
+    def run(self, url, fn, *args):
+        host = url_host(url)
+        with self._lock:
+            entry = self._hosts.setdefault(host, [threading.BoundedSemaphore(self.per_host), 0.0])
+        with entry[0]:
+            if self.delay:
+                with self._lock:
+                    start = max(time.monotonic(), entry[1])
+                    entry[1] = start + self.delay
+                wait = start - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+            return fn(url, *args)
+
+def interleave_hosts(items, url_index=1):
+    # Round-robin over hosts so one big site doesn't hold every worker waiting
+    # on its per-host limit
+    by_host = {}
+    for item in items:
+        by_host.setdefault(url_host(item[url_index]), []).append(item)
+    queues = list(by_host.values())
+    result = []
+    for depth in range(max(map(len, queues), default=0)):
+        result.extend(queue[depth] for queue in queues if depth < len(queue))
+    return result
+
+def iter_fetch(fn, items, max_workers=16, per_host=4, host_delay=0.0):
+    # items: (key, url, *args); yields (key, fn(url, *args)) as each call
+    # finishes. Calls not started yet are dropped if the caller stops early.
+    items = interleave_hosts(items)
+    if not items:
+        return
+    limiter = HostLimiter(per_host, host_delay)
+    pool = ThreadPoolExecutor(max_workers=min(max_workers, len(items)))
+    try:
+        futures = {pool.submit(limiter.run, url, fn, *args): key for key, url, *args in items}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+def iter_pages(items, max_workers=16, per_host=4, host_delay=0.0, capture=None):
+    # items: (key, url, etag, last_modified); yields (key, Page)
+    fetch = partial(fetch_page, capture=capture) if capture else fetch_page
+    return iter_fetch(fetch, items, max_workers, per_host, host_delay)
+
+def iter_links(items, max_workers=32, per_host=2, host_delay=0.0):
+    # items: (key, url); yields (key, Link)
+    return iter_fetch(check_link, items, max_workers, per_host, host_delay)